@@ -1 +1,3 @@
 from .implementation import *
+from .architecture.Precision import Precision, getPrecision, setPrecision
+from .architecture.Profiler import Profiler, profile
@@ -27,11 +27,17 @@ class Activation(BaseLayer):
         elif self._activation == "softmax":
             self._graph = self._graph.softmax()
             return self._graph
+        elif self._activation == "log_softmax":
+            self._graph = self._graph.log_softmax()
+            return self._graph
         assert False, "Unknown activation function"
 
     def getTrainable(self) -> list:
         return []
 
+    def getConfig(self) -> dict:
+        return {"name": self._activation}
+
     def getGraph(self) -> Graph:
         assert self._graph is not None, "Must call setInput() at first"
         return self._graph
@@ -19,3 +19,17 @@ class BaseLayer(ABC):
     @abstractmethod
     def __call__(self, *args, **kwargs) -> Graph:
         pass
+
+    def getConfig(self) -> dict | None:
+        """
+        :return: keyword arguments of the constructor saved by Model.save,
+                 None if the layer cannot be rebuilt from a file
+        """
+        return None
+
+    def setTrainable(self, variables: list[Variable]):
+        """
+        Sets variables in order of getTrainable(), used instead
+        of initial ones by the next setInput()
+        """
+        assert len(variables) == 0, f"{type(self).__name__} has no trainable variables"
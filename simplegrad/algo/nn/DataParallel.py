@@ -0,0 +1,211 @@
+import multiprocessing
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from simplegrad.algo.optimize.ParameterBuffer import ParameterBuffer
+
+
+def _sharedArray(memory: SharedMemory, shape, dtype) -> np.ndarray:
+    return np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+class _RemoteTraceback(Exception):
+    """
+    Traceback of an exception raised in a worker, cause of the exception re-raised by the main process
+    """
+
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+
+def _worker(model, loss, rank: int, connection, params: np.ndarray, grads: np.ndarray):
+    """
+    Replica of the model in a forked process. Its variables are views of the
+    shared parameters and its gradients views of its row of shared gradients.
+    Replies ("ok", result) to every command, or ("error", exception, traceback)
+    and stops once a command fails
+    """
+    try:
+        variables = model._trainable()
+        buffer = ParameterBuffer(variables, values=params, grads=grads[rank])
+        graphs = {}
+        tape = None
+        while True:
+            command, *args = connection.recv()
+            if command == "forward":
+                X_batch, y_batch, checkpoint = args
+                # Parameters were updated by the main process
+                buffer.touch()
+                tape = model._trainingGraph(graphs, loss, X_batch, y_batch).compile(checkpoint=checkpoint)
+                tape.zeroGrad()
+                connection.send(("ok", tape.forward().copy()))
+            elif command == "backward":
+                tape.backward(ignore_warnings=True, seed=args[0])
+                buffer.gather()
+                connection.send(("ok", None))
+            else:
+                break
+    except Exception as error:
+        text = traceback.format_exc()
+        try:
+            connection.send(("error", error, text))
+        except Exception:
+            # Exception that cannot be pickled
+            connection.send(("error", RuntimeError(f"Worker {rank} failed"), text))
+    finally:
+        connection.close()
+
+
+class DataParallel:
+    """
+    Data-parallel training of a model: every batch is split by rows across
+    worker processes, each holding a replica of the model graph.
+    Parameters and per-worker gradients live in shared memory. Losses are sums
+    over rows, so gradients of the shards are summed into the variables of
+    the main process and the optimizer step equals a single-process one.
+    Updated parameters are published to the workers before the next forward.
+
+    Behaves as the loss graph for optimizers (see BaseOptimizer._calcGrad),
+    so any first-order optimizer works unchanged. Workers are forked,
+    which needs a platform with the fork start method (e.g. Linux)
+    """
+
+    def __init__(self, model, loss, processes: int):
+        """
+        :param model: model whose variables were created by a training graph
+        :param loss: loss function of (prediction, y)
+        :param processes: number of worker processes
+        """
+        variables = model._trainable()
+        assert len(variables) > 0 and all([var is not None for var in variables]), \
+            "Model variables must be created before forking workers"
+        self._variables = variables
+        self._processes = processes
+        dtype = variables[0]._dtype
+        size = sum([var.value.size for var in variables])
+        self._paramsMemory = SharedMemory(create=True, size=max(size * dtype.itemsize, 1))
+        self._gradsMemory = SharedMemory(create=True, size=max(processes * size * dtype.itemsize, 1))
+        self._params = _sharedArray(self._paramsMemory, (size,), dtype)
+        self._grads = _sharedArray(self._gradsMemory, (processes, size), dtype)
+        self._grads.fill(0)
+        self._views = []
+        start = 0
+        for var in variables:
+            stop = start + var.value.size
+            self._views.append((self._params[start:stop].reshape(var.shape), start, stop))
+            start = stop
+        self._publish()
+
+        context = multiprocessing.get_context("fork")
+        self._connections = []
+        self._workers = []
+        for rank in range(processes):
+            connection, child = context.Pipe()
+            worker = context.Process(target=_worker, args=(model, loss, rank, child, self._params, self._grads),
+                                     daemon=True)
+            worker.start()
+            child.close()
+            self._connections.append(connection)
+            self._workers.append(worker)
+        self._shards = []
+        self._frwd = None
+        self._checkpoint = None
+        self._compute = variables[0]._compute
+
+    def _receive(self, rank: int):
+        """
+        Reply of a worker, exceptions raised by it are raised again
+        """
+        status, *reply = self._connections[rank].recv()
+        if status == "error":
+            error, text = reply
+            raise error from _RemoteTraceback(text)
+        return reply[0]
+
+    def _publish(self):
+        for var, (view, start, stop) in zip(self._variables, self._views):
+            np.copyto(view, var.value)
+
+    def feed(self, X_batch, y_batch):
+        """
+        Splits the next batch into shards of workers
+        """
+        xs = np.array_split(X_batch, self._processes)
+        ys = np.array_split(y_batch, self._processes)
+        self._shards = [(rank, X, y) for rank, (X, y) in enumerate(zip(xs, ys)) if len(X) > 0]
+        return self
+
+    def compile(self, workers=None, checkpoint=None):
+        # Workers compile their replicas with the same checkpointing
+        self._checkpoint = checkpoint
+        return self
+
+    def zeroGrad(self):
+        # Workers zero their gradients on forward
+        pass
+
+    def _lossScaling(self) -> bool:
+        return self._compute.itemsize < 4
+
+    def forward(self) -> np.ndarray:
+        self._publish()
+        for rank, X, y in self._shards:
+            self._connections[rank].send(("forward", X, y, self._checkpoint))
+        self._frwd = sum([self._receive(rank) for rank, X, y in self._shards])
+        return self._frwd
+
+    def backward(self, ignore_warnings=False, seed=None):
+        for rank, X, y in self._shards:
+            self._connections[rank].send(("backward", seed))
+        for rank, X, y in self._shards:
+            self._receive(rank)
+        # Gradient of the batch is the sum over shards
+        ranks = [rank for rank, X, y in self._shards]
+        total = np.sum(self._grads[ranks], axis=0)
+        for var, (view, start, stop) in zip(self._variables, self._views):
+            grad = total[start:stop].reshape(var.shape)
+            if var._grad is None or var._grad.shape != var.shape:
+                var._grad = grad.copy()
+            else:
+                np.copyto(var._grad, grad)
+
+    @property
+    def scalar(self):
+        return self._frwd[0, 0]
+
+    @property
+    def value(self):
+        return self._frwd
+
+    def close(self):
+        """
+        Stops workers and frees shared memory, also after a worker failed
+        """
+        try:
+            for connection in self._connections:
+                try:
+                    connection.send(("stop",))
+                except (BrokenPipeError, ConnectionResetError):
+                    # Worker already stopped
+                    pass
+                connection.close()
+            for worker in self._workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+        finally:
+            self._connections = []
+            self._workers = []
+            self._params = None
+            self._grads = None
+            self._views = []
+            for memory in (self._paramsMemory, self._gradsMemory):
+                memory.close()
+                memory.unlink()
@@ -8,7 +8,7 @@ import numpy as np
 class DenseLayer(BaseLayer):
     def __init__(self, num_neurons: int, activation: str | Activation = "relu"):
         self._num_neurons = num_neurons
-        self._bias = Variable(np.zeros((1, num_neurons)))
+        self._bias = None
         if isinstance(activation, str):
             self._activation = Activation(activation)
         else:
@@ -22,10 +22,12 @@ class DenseLayer(BaseLayer):
     def setInput(self, input: Graph):
         self._features = input.shape[1]
         assert len(input.shape) == 2, "Expected input shape to be (n, features)"
+        # Created with the first input, so they follow its precision policy
         if self._weight is None:
             self._weight = Variable(
                 np.random.random((self._features, self._num_neurons)) * 2 - 1
             )
+            self._bias = Variable(np.zeros((1, self._num_neurons)))
 
         self._shape = (input.shape[0], self._num_neurons)
         self._graph = input @ self._weight + self._bias
@@ -35,6 +37,13 @@ class DenseLayer(BaseLayer):
     def getTrainable(self) -> list[Variable]:
         return [self._weight, self._bias]
 
+    def setTrainable(self, variables: list[Variable]):
+        self._weight, self._bias = variables
+
+    def getConfig(self) -> dict:
+        activation = None if self._activation is None else self._activation._activation
+        return {"num_neurons": self._num_neurons, "activation": activation}
+
     def getGraph(self) -> Graph:
         assert self._graph is not None, "Must call setInput() at first"
         return self._graph
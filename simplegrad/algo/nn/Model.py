@@ -1,73 +1,240 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
 from simplegrad import Graph
-from simplegrad.algo.nn import BaseLayer
-from simplegrad.algo.optimize import Adam
-from simplegrad.algo.optimize.BaseOptimiser import BaseOptimizer
-from tqdm.auto import tqdm
+from simplegrad.architecture.Precision import Precision, getPrecision
+from simplegrad.architecture.Profiler import Profiler
+from simplegrad.architecture.WeightFile import readWeights, writeWeights
+from simplegrad.algo.nn.BaseLayer import BaseLayer
+import numpy as np
 
 from simplegrad.implementation.primitives.Value import Value
+from simplegrad.implementation.primitives.Placeholder import Placeholder
+from simplegrad.implementation.primitives.Variable import Variable
+
+if TYPE_CHECKING:
+    from simplegrad.algo.optimize.BaseOptimiser import BaseOptimizer
 
 
 class Model:
-    def __init__(self, modelFactory, layers: list[BaseLayer]):
+    def __init__(self, modelFactory, layers: list[BaseLayer], precision: Precision = None):
+        """
+        :param precision: dtype policy of the model graphs, policy active
+                          when the graph is built if None
+        """
         self._modelFactory = modelFactory
         self._layers = layers
+        self._precision = precision
+        self._inference = None
+        # Profiler of the last fit(profile=True)
+        self.profiler = None
 
-    def fit(self, X, y, loss="mse", optimizer: BaseOptimizer = Adam(), iterations=100, verbose=0, history=None):
-        if not isinstance(X, Value):
-            X = Value(X)
-        if not isinstance(y, Value):
-            y = Value(y)
-        loss = self._parseLoss(loss)
-        graph = self._modelFactory(X)
-        graph = loss(graph, y)
-        assert graph.shape == (1, 1), f"Loss must return scalar, got {graph.shape}"
-
-        vars = []
-        for layer in self._layers:
-            vars += list(layer.getTrainable())
+    def fit(self, X, y=None, loss="mse", optimizer: BaseOptimizer = None, iterations=100, verbose=0, history=None,
+            batch_size=None, shuffle=False, epochs=None, chunk_size=None, processes=None,
+            checkpoint=None, profile=False):
+        """
+        :param X: features, or iterable of (X_batch, y_batch) chunks when y is None
+        :param y: targets
+        :param loss: "mse", "mae", "crossentropy" or function of (prediction, y)
+                     returning a scalar graph
+        :param optimizer: Adam with default parameters if None
+        :param iterations: number of epochs if epochs is not given
+        :param batch_size: rows per optimizer step, whole dataset if None
+        :param shuffle: reshuffle rows before every epoch
+        :param epochs: number of passes over the data
+        :param chunk_size: evaluate mse/mae loss over blocks of chunk_size rows of a batch,
+                           so e.g. a memory-mapped X is never materialised at once
+        :param processes: split every batch across that many worker processes,
+                          see DataParallel
+        :param checkpoint: "layers" or number of kernels, recompute intermediate values
+                           of every layer or segment in backward instead of keeping them
+                           (sets checkpoint of the optimizer, see CompiledGraph)
+        :param profile: record kernels of training steps into model.profiler, see Profiler
+        """
+        if isinstance(X, Value):
+            X = X.value
+        if isinstance(y, Value):
+            y = y.value
+        if epochs is None:
+            epochs = iterations
+        if optimizer is None:
+            from simplegrad.algo.optimize import Adam
+            optimizer = Adam()
+        loss = self._parseLoss(loss, chunk_size=chunk_size)
+        if checkpoint is not None:
+            optimizer.checkpoint = "marked" if checkpoint == "layers" else checkpoint
+        # Weights mapped by loadWeights() are copied before optimizers update them in place
+        for var in self._trainable():
+            if var is not None and not var.value.flags.writeable:
+                var.value = np.array(var.value)
 
-        self._graph = graph
-        optimizer.setModel(graph)
-        optimizer.setVariables(vars)
+        # Graph is built once per row shape, batches are fed through placeholders
+        graphs = {}
+        self._graph = None
 
         iterator = range
         if verbose > 0:
+            # Progress bar is imported only when it is shown
+            from tqdm.auto import tqdm
             iterator = lambda x: tqdm(range(x))
 
-        for iter in iterator(iterations):
-            optimizer.step()
-            if verbose > 1:
-                print(f"Step <{iter + 1}/{iterations}> | loss: {graph.scalar}")
-            if history is not None:
-                history.append(graph.scalar)
+        parallel = None
+        profiler = None
+        if profile:
+            self.profiler = profiler = Profiler().__enter__()
+        try:
+            for epoch in iterator(epochs):
+                steps = 0
+                for X_batch, y_batch in self._batches(X, y, batch_size, shuffle):
+                    if processes is None:
+                        graph = self._trainingGraph(graphs, loss, X_batch, y_batch)
+                    else:
+                        if parallel is None:
+                            from simplegrad.algo.nn.DataParallel import DataParallel
+                            # Variables are created by the first graph, then replicated by workers
+                            self._trainingGraph(graphs, loss, X_batch, y_batch)
+                            parallel = DataParallel(self, loss, processes)
+                        graph = parallel.feed(X_batch, y_batch)
+                    if graph is not self._graph:
+                        optimizer.setModel(graph)
+                        if self._graph is None:
+                            optimizer.setVariables(self._trainable())
+                        self._graph = graph
+                    optimizer.step()
+                    steps += 1
+                    if verbose > 1:
+                        print(f"Epoch <{epoch + 1}/{epochs}> step <{steps}> | loss: {graph.scalar}")
+                    if history is not None:
+                        history.append(graph.scalar)
+                if steps == 0:
+                    # One-shot iterator is exhausted
+                    break
+        finally:
+            if profiler is not None:
+                profiler.__exit__(None, None, None)
+            if parallel is not None:
+                parallel.close()
+
+    def _trainingGraph(self, graphs: dict, loss, X_batch, y_batch) -> Graph:
+        # Placeholders take any number of rows, one graph and tape serve every batch size
+        key = (np.shape(X_batch)[1:], np.shape(y_batch)[1:])
+        if key not in graphs:
+            with self._precision or getPrecision():
+                X = Placeholder(X_batch)
+                y = Placeholder(y_batch)
+                graph = loss(self._modelFactory(X), y)
+                # Layer outputs end segments of checkpoint="layers"
+                for layer in self._layers:
+                    layer.getGraph().checkpoint()
+            assert graph.shape == (1, 1), f"Loss must return scalar, got {graph.shape}"
+            graphs[key] = (X, y, graph)
+        X, y, graph = graphs[key]
+        X.feed(X_batch)
+        y.feed(y_batch)
+        return graph
+
+    @staticmethod
+    def _batches(X, y, batch_size, shuffle):
+        if y is None:
+            yield from X
+            return
+        size = len(X)
+        if batch_size is None:
+            batch_size = size
+        order = np.random.permutation(size) if shuffle else None
+        for start in range(0, size, batch_size):
+            if order is None:
+                yield X[start:start + batch_size], y[start:start + batch_size]
+            else:
+                rows = order[start:start + batch_size]
+                yield X[rows], y[rows]
+
+    def _trainable(self) -> list:
+        vars = []
+        for layer in self._layers:
+            vars += list(layer.getTrainable())
+        return vars
 
     def predict(self, X):
-        if not isinstance(X, Value):
-            X = Value(X)
-        graph = self._modelFactory(X)
-        return graph.forward()
+        """
+        Runs the inference graph, built on the first call.
+        Later calls only feed X, its number of rows may differ between calls
+        """
+        if isinstance(X, Value):
+            X = X.value
+        if self._inference is None:
+            with self._precision or getPrecision():
+                input = Placeholder(X)
+                self._inference = (input, self._modelFactory(input))
+        input, graph = self._inference
+        input.feed(X)
+        return graph.compile().forward()
+
+    def save(self, path):
+        """
+        Writes configs of layers, precision and variables of the model
+        into one file (see writeWeights). Variables are created by the
+        first fit() or predict()
+        """
+        variables = self._trainable()
+        assert all([var is not None for var in variables]), "Model must be fitted or run before save"
+        precision = None
+        if self._precision is not None:
+            precision = {"compute": self._precision.compute.str, "master": self._precision.master.str}
+        header = {
+            "layers": [{"class": type(layer).__name__, "config": layer.getConfig()} for layer in self._layers],
+            "precision": precision,
+            "names": [var.defined_name for var in variables],
+        }
+        writeWeights(path, header, [var.value for var in variables])
 
-    def _parseLoss(self, loss):
+    def loadWeights(self, path):
+        """
+        Sets variables of layers to weights of a file written by save().
+        Weights are memory-mapped read-only, they are copied only
+        by fit() or when their dtype differs from the master one
+        """
+        header, arrays = readWeights(path)
+        self._setWeights(header, arrays)
+
+    def _setWeights(self, header: dict, arrays: list):
+        variables = self._trainable()
+        assert len(arrays) == len(variables), f"Expected {len(variables)} arrays, file has {len(arrays)}"
+        if all([var is not None for var in variables]):
+            # Graphs already built keep their variables
+            for var, array in zip(variables, arrays):
+                assert var.shape == array.shape, f"Variable of shape {var.shape} got weights of {array.shape}"
+                var.value = array
+            return
+        names = iter(header["names"])
+        arrays = iter(arrays)
+        with self._precision or getPrecision():
+            for layer in self._layers:
+                count = len(layer.getTrainable())
+                layer.setTrainable([Variable(next(arrays), def_name=next(names), copy=False) for _ in range(count)])
+
+    def _parseLoss(self, loss, chunk_size=None):
         if loss == "mse":
-            def mean_squared_error(ytrue, ypred):
-                return ((ytrue - ypred) ** 2).sum()
+            def mean_squared_error(ypred, ytrue):
+                return ((ytrue - ypred) ** 2).sum(chunk_size=chunk_size)
 
             loss = mean_squared_error
         elif loss == "mae":
-            def mean_absolute_error(ytrue, ypred):
-                return ((ytrue - ypred).abs()).sum()
+            def mean_absolute_error(ypred, ytrue):
+                return ((ytrue - ypred).abs()).sum(chunk_size=chunk_size)
 
             loss = mean_absolute_error
         elif loss == "crossentropy":
-            def crossentropy(y_true, y_pred):
-                return (-1 * (y_pred + 1e-8).ln() * y_true).sum()
+            def crossentropy(y_pred, y_true):
+                return y_pred.crossentropy(y_true)
             loss = crossentropy
         return loss
 
 
 class SequentialModel(Model):
-    def __init__(self, layers: list[BaseLayer]):
-        super().__init__(self._makeModel, layers)
+    def __init__(self, layers: list[BaseLayer], precision: Precision = None):
+        super().__init__(self._makeModel, layers, precision=precision)
         self._layers = layers
 
     def _makeModel(self, X):
@@ -75,3 +242,38 @@ class SequentialModel(Model):
         for layer in self._layers:
             graph = layer(graph)
         return graph
+
+    @classmethod
+    def load(cls, path) -> SequentialModel:
+        """
+        Rebuilds a model written by save() from configs of its layers.
+        Only the header is read, weights stay memory-mapped read-only,
+        so the load takes time of the model size rather than of its weights
+        and processes serving one file share its pages
+        """
+        header, arrays = readWeights(path)
+        classes = _layerClasses()
+        layers = []
+        for layer in header["layers"]:
+            assert layer["config"] is not None and layer["class"] in classes, \
+                f"Layer {layer['class']} cannot be rebuilt, use loadWeights() of a constructed model"
+            layers.append(classes[layer["class"]](**layer["config"]))
+        precision = header["precision"]
+        if precision is not None:
+            precision = Precision(precision["compute"], master=precision["master"])
+        model = cls(layers, precision=precision)
+        model._setWeights(header, arrays)
+        return model
+
+
+def _layerClasses() -> dict:
+    """
+    :return: imported layer classes by name
+    """
+    classes = {}
+    pending = [BaseLayer]
+    while pending:
+        layer = pending.pop()
+        classes[layer.__name__] = layer
+        pending += layer.__subclasses__()
+    return classes
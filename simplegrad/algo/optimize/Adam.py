@@ -4,7 +4,11 @@ from .BaseOptimiser import BaseOptimizer
 
 
 class Adam(BaseOptimizer):
-    def __init__(self, model=None, variables: list=None, lr=1e-2, betta1=0.9, betta2=0.99, eps=1e-8):
+    def __init__(self, model=None, variables: list=None, lr=1e-2, betta1=0.9, betta2=0.99, eps=1e-8, flat=False):
+        """
+        :param flat: pack variables and moments into flat buffers,
+                     every step is a few in-place operations on them
+        """
         self._betta1 = betta1
         self._betta2 = betta2
         self._lr = lr
@@ -12,12 +16,19 @@ class Adam(BaseOptimizer):
         self._model = model
         self._m: dict[Any, np.ndarray | None] = dict()
         self._v: dict[Any, np.ndarray | None] = dict()
+        self._flatM = None
+        self._flatV = None
+        self.flat = flat
         if variables is not None:
             self.setVariables(variables)
 
     def step(self):
-        self._model.zeroGrad()
-        self._model.calcGrad()
+        if not self._calcGrad():
+            return
+
+        if self._buffer is not None:
+            self._flatStep()
+            return
 
         for var in self._variables:
             grad = var.grad
@@ -31,6 +42,29 @@ class Adam(BaseOptimizer):
             self._m[var._id] = newm
             self._v[var._id] = newv
 
+    def _flatStep(self):
+        buffer = self._buffer
+        grads, scratch = buffer.grads, buffer.scratch
+        if self._flatM is None:
+            self._flatM = grads.copy()
+            self._flatV = np.square(grads)
+        m, v = self._flatM, self._flatV
+        # Step uses moments of the previous step, as the per-variable loop does
+        np.sqrt(v, out=scratch)
+        scratch += self._eps
+        np.divide(m, scratch, out=scratch)
+        scratch *= self._lr
+        buffer.values -= scratch
+        buffer.touch()
+
+        m *= self._betta1
+        np.multiply(grads, 1 - self._betta1, out=scratch)
+        m += scratch
+        v *= self._betta2
+        np.square(grads, out=scratch)
+        scratch *= 1 - self._betta2
+        v += scratch
+
     def setModel(self, model):
         self._model = model
 
@@ -39,6 +73,9 @@ class Adam(BaseOptimizer):
         for var in vars:
             self._m[var._id] = None
             self._v[var._id] = None
+        self._flatM = None
+        self._flatV = None
+        self._pack(vars)
 
     @property
     def lr(self):
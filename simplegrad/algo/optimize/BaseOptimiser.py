@@ -1,13 +1,86 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 from simplegrad import Variable
+from .ParameterBuffer import ParameterBuffer
 
 
 class BaseOptimizer(ABC):
+    # Run forward/backward through model.compile() tape
+    compiled = True
+    # Threads of the compiled tape, see CompiledGraph
+    workers = None
+    # Recompute intermediate values in backward, see CompiledGraph
+    checkpoint = None
+
+    # Dynamic loss scaling for float16 compute: backward is seeded with
+    # the scale so small gradients do not flush to zero, gradients are
+    # unscaled before the step. Overflowed steps are skipped and halve
+    # the scale, it is doubled after scale_window steps without overflow
+    loss_scale = 2.0 ** 15
+    scale_window = 1000
+    _goodSteps = 0
+
+    # Pack variables into one ParameterBuffer, steps are then
+    # vectorized over all of them (see flat argument of optimizers)
+    flat = False
+    _buffer = None
+
     @abstractmethod
     def step(self):
         pass
 
+    def _calcGrad(self, model=None) -> bool:
+        """
+        :return: False if gradients overflowed and the step must be skipped
+        """
+        if model is None:
+            model = self._model
+        scaled = model._lossScaling()
+        if self.compiled:
+            model = model.compile(workers=self.workers, checkpoint=self.checkpoint)
+        model.zeroGrad()
+        model.forward()
+        if not scaled:
+            model.backward()
+            self._gather()
+            return True
+        # Overflow is expected while the scale is searched for
+        with np.errstate(over='ignore', invalid='ignore'):
+            model.backward(seed=self.loss_scale)
+            self._gather()
+            return self._unscale()
+
+    def _pack(self, vars):
+        self._buffer = None
+        if self.flat and len(vars) > 0:
+            self._buffer = ParameterBuffer(vars)
+
+    def _gather(self):
+        if self._buffer is not None:
+            self._buffer.gather()
+
+    def _unscale(self) -> bool:
+        if self._buffer is not None:
+            grads = self._buffer.grads
+            np.divide(grads, self.loss_scale, out=grads)
+            finite = np.isfinite(grads).all()
+        else:
+            finite = True
+            for var in self._variables:
+                np.divide(var.grad, self.loss_scale, out=var.grad)
+                finite = finite and np.isfinite(var.grad).all()
+        if not finite:
+            self.loss_scale /= 2
+            self._goodSteps = 0
+            return False
+        self._goodSteps += 1
+        if self._goodSteps >= self.scale_window:
+            self.loss_scale *= 2
+            self._goodSteps = 0
+        return True
+
     @abstractmethod
     def setModel(self, model):
         pass
@@ -1,9 +1,14 @@
+import numpy as np
 from .BaseOptimiser import BaseOptimizer
 
 
 class GD(BaseOptimizer):
-    def __init__(self, model=None, variables: list=[], lr=1e-2):
+    def __init__(self, model=None, variables: list=[], lr=1e-2, flat=False):
+        """
+        :param flat: pack variables into one ParameterBuffer
+        """
         self._model = model
+        self.flat = flat
         self.setVariables(variables)
         self._lr = lr
 
@@ -11,16 +16,24 @@ class GD(BaseOptimizer):
         self._model = model
 
     def step(self):
-        self._model.zeroGrad()
-        self._model.calcGrad()
+        if not self._calcGrad():
+            return
 
         assert len(self._variables) > 0, "No variables to optimize"
 
+        if self._buffer is not None:
+            buffer = self._buffer
+            np.multiply(buffer.grads, self._lr, out=buffer.scratch)
+            buffer.values -= buffer.scratch
+            buffer.touch()
+            return
+
         for var in self._variables:
             var.value -= self._lr * var.grad
 
     def setVariables(self, vars):
         self._variables = vars
+        self._pack(vars)
 
     @property
     def lr(self):
@@ -4,11 +4,16 @@ from .BaseOptimiser import BaseOptimizer
 
 
 class Momentum(BaseOptimizer):
-    def __init__(self, model=None, variables: list=None, lr=1e-2, betta=0.9):
+    def __init__(self, model=None, variables: list=None, lr=1e-2, betta=0.9, flat=False):
+        """
+        :param flat: pack variables and state into flat buffers
+        """
         self._betta = betta
         self._lr = lr
         self._model = model
         self._s: dict[Any, np.ndarray | None] = dict()
+        self._flatS = None
+        self.flat = flat
         if variables is not None:
             self.setVariables(variables)
 
@@ -16,8 +21,12 @@ class Momentum(BaseOptimizer):
         self._model = model
 
     def step(self):
-        self._model.zeroGrad()
-        self._model.calcGrad()
+        if not self._calcGrad():
+            return
+
+        if self._buffer is not None:
+            self._flatStep()
+            return
 
         for var in self._variables:
             grad = var.grad
@@ -27,10 +36,25 @@ class Momentum(BaseOptimizer):
             var.value -= self._lr * momentum
             self._s[var._id] = momentum
 
+    def _flatStep(self):
+        buffer = self._buffer
+        grads, scratch = buffer.grads, buffer.scratch
+        if self._flatS is None:
+            self._flatS = grads.copy()
+        momentum = self._flatS
+        momentum *= self._betta
+        np.multiply(grads, 1 - self._betta, out=scratch)
+        momentum += scratch
+        np.multiply(momentum, self._lr, out=scratch)
+        buffer.values -= scratch
+        buffer.touch()
+
     def setVariables(self, vars):
         self._variables = vars
         for var in vars:
             self._s[var._id] = None
+        self._flatS = None
+        self._pack(vars)
 
     @property
     def lr(self):
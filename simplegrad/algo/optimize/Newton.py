@@ -22,21 +22,30 @@ class Newton(BaseOptimizer):
             self._modelGrad[var._id] = self._model.gradientGraph(by=var)
 
     def step(self):
-        self._model.zeroGrad()
-        self._model.calcGrad()
+        self._calcGrad()
         grads = np.array([var.grad[0,0] for var in self._variables])
         hess = []
         for var in self._variables:
-            gradModel = self._modelGrad[var._id]
-            gradModel.zeroGrad()
-            gradModel.calcGrad()
-            varhess = [var2.grad[0,0] for var2 in self._variables]
+            graph = self._modelGrad[var._id]
+            if graph.requires_grad:
+                self._calcGrad(graph)
+            # Simplified derivative may not depend on every variable
+            varhess = [var2.grad[0,0] if graph.requires_grad and graph._dependsOn(var2) else 0.0
+                       for var2 in self._variables]
             hess.append(varhess)
         hess = np.array(hess)
         steps = np.linalg.inv(hess) @ grads
         for i, var in enumerate(self._variables):
             var.value -= steps[i]
 
+    @property
+    def report(self) -> dict:
+        """
+        Total size of derivative graphs, see GraphBase.derivativeReport()
+        """
+        reports = [self._model.derivativeReport(by=var) for var in self._variables]
+        return {key: sum([report[key] for report in reports]) for key in ("naive", "simplified")}
+
     @property
     def lr(self):
         return self._lr
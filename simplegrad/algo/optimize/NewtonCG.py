@@ -0,0 +1,87 @@
+import numpy as np
+from .BaseOptimiser import BaseOptimizer
+
+
+class NewtonCG(BaseOptimizer):
+    """
+    Truncated Newton method: the Newton step is solved by conjugate gradients
+    from Hessian-vector products (see GraphBase.hvp), the Hessian is never formed.
+    Variables of any shape are optimized together as one vector
+    """
+
+    def __init__(self, model=None, variables: list=None, lr=1.0, max_iter=10, tol=1e-5, damping=0.0):
+        """
+        :param lr: fraction of the Newton step taken
+        :param max_iter: maximal number of conjugate gradient iterations per step
+        :param tol: conjugate gradients stop once residual norm drops below tol times gradient norm
+        :param damping: added to the Hessian diagonal, keeps steps short where curvature is small
+        """
+        self._model = model
+        self._lr = lr
+        self._max_iter = max_iter
+        self._tol = tol
+        self._damping = damping
+        self._variables = []
+        if variables is not None:
+            self.setVariables(variables)
+
+    def setModel(self, model):
+        self._model = model
+
+    def setVariables(self, vars):
+        self._variables = vars
+
+    @staticmethod
+    def _dot(left: list, right: list) -> float:
+        return sum([np.vdot(l, r) for l, r in zip(left, right)])
+
+    def _hessianProduct(self, vector: list) -> list:
+        product = self._model.hvp(self._variables, vector)
+        if self._damping:
+            product = [p + self._damping * v for p, v in zip(product, vector)]
+        return product
+
+    def _solve(self, grads: list) -> list:
+        """
+        Approximately solves H x = -g. Stops at the first direction of
+        non-positive curvature, falling back to -g if it is the first one
+        """
+        residual = [-grad for grad in grads]
+        step = [np.zeros_like(grad) for grad in grads]
+        direction = residual
+        residualNorm = self._dot(residual, residual)
+        stop = (self._tol ** 2) * residualNorm
+        for i in range(self._max_iter):
+            if residualNorm <= stop or residualNorm == 0:
+                break
+            product = self._hessianProduct(direction)
+            curvature = self._dot(direction, product)
+            if curvature <= 0:
+                if i == 0:
+                    step = direction
+                break
+            alpha = residualNorm / curvature
+            step = [s + alpha * d for s, d in zip(step, direction)]
+            residual = [r - alpha * p for r, p in zip(residual, product)]
+            newNorm = self._dot(residual, residual)
+            direction = [r + (newNorm / residualNorm) * d for r, d in zip(residual, direction)]
+            residualNorm = newNorm
+        return step
+
+    def step(self):
+        if not self._calcGrad():
+            return
+
+        assert len(self._variables) > 0, "No variables to optimize"
+
+        grads = [np.array(var.grad) for var in self._variables]
+        for var, step in zip(self._variables, self._solve(grads)):
+            var.value += self._lr * step
+
+    @property
+    def lr(self):
+        return self._lr
+
+    @lr.setter
+    def lr(self, value):
+        self._lr = value
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class ParameterBuffer:
+    """
+    Values and gradients of variables packed into two contiguous arrays.
+    Variables hold reshaped views into them, so an optimizer updates every
+    variable with a few in-place operations on the whole buffer. Compiled
+    tapes accumulate gradients of packed variables directly into the views
+    """
+
+    def __init__(self, variables: list, values: np.ndarray = None, grads: np.ndarray = None):
+        """
+        :param values: flat array already holding values of variables
+                       (e.g. shared memory), allocated if None
+        :param grads: flat array for gradients, allocated if None
+        """
+        dtypes = set([var._dtype for var in variables])
+        assert len(dtypes) == 1, f"Packed variables must share dtype, got {dtypes}"
+        dtype = dtypes.pop()
+        size = sum([var.value.size for var in variables])
+        adopt = values is not None
+        self.values = np.empty(size, dtype=dtype) if values is None else values
+        self.grads = np.zeros(size, dtype=dtype) if grads is None else grads
+        assert self.values.shape == (size,) and self.grads.shape == (size,), f"Buffers of {size} elements expected"
+        # Temporary of optimizer steps
+        self.scratch = np.empty(size, dtype=dtype)
+        self._variables = variables
+        self._grads = []
+
+        start = 0
+        for var in variables:
+            stop = start + var.value.size
+            value = self.values[start:stop].reshape(var.shape)
+            if not adopt:
+                value[...] = var.value
+            grad = self.grads[start:stop].reshape(var.shape)
+            if var.grad is not None and var.grad.shape == var.shape:
+                grad[...] = var.grad
+            var._value = value
+            var._grad = grad
+            var._packed = True
+            var._version += 1
+            self._grads.append(grad)
+            start = stop
+
+    def gather(self):
+        """
+        Copies gradients written outside of the buffer into it
+        (e.g. by a tape compiled before the variables were packed)
+        """
+        for var, grad in zip(self._variables, self._grads):
+            if var._grad is not grad:
+                np.copyto(grad, var._grad)
+
+    def touch(self):
+        """
+        Marks variables changed after the buffer was updated in place
+        """
+        for var in self._variables:
+            var._version += 1
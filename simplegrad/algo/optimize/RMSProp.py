@@ -4,12 +4,17 @@ from .BaseOptimiser import BaseOptimizer
 
 
 class RMSProp(BaseOptimizer):
-    def __init__(self, model=None, variables: list=None, lr=1e-2, betta=0.99, eps=1e-6):
+    def __init__(self, model=None, variables: list=None, lr=1e-2, betta=0.99, eps=1e-6, flat=False):
+        """
+        :param flat: pack variables and state into flat buffers
+        """
         self._betta = betta
         self._lr = lr
         self._eps = eps
         self._model = model
         self._s: dict[Any, np.ndarray | None] = dict()
+        self._flatS = None
+        self.flat = flat
         if variables is not None:
             self.setVariables(variables)
 
@@ -20,10 +25,16 @@ class RMSProp(BaseOptimizer):
         self._variables = vars
         for var in vars:
             self._s[var._id] = None
+        self._flatS = None
+        self._pack(vars)
 
     def step(self):
-        self._model.zeroGrad()
-        self._model.calcGrad()
+        if not self._calcGrad():
+            return
+
+        if self._buffer is not None:
+            self._flatStep()
+            return
 
         for var in self._variables:
             grad = var.grad
@@ -33,6 +44,23 @@ class RMSProp(BaseOptimizer):
             var.value -= self._lr * grad / (np.sqrt(momentum) + self._eps)
             self._s[var._id] = momentum
 
+    def _flatStep(self):
+        buffer = self._buffer
+        grads, scratch = buffer.grads, buffer.scratch
+        if self._flatS is None:
+            self._flatS = np.square(grads)
+        momentum = self._flatS
+        momentum *= self._betta
+        np.square(grads, out=scratch)
+        scratch *= 1 - self._betta
+        momentum += scratch
+        np.sqrt(momentum, out=scratch)
+        scratch += self._eps
+        np.divide(grads, scratch, out=scratch)
+        scratch *= self._lr
+        buffer.values -= scratch
+        buffer.touch()
+
     @property
     def lr(self):
         return self._lr
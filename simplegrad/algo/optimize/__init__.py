@@ -1,5 +1,18 @@
-from .GD import GD
-from .Newton import Newton
-from .Momentum import Momentum
-from .RMSProp import RMSProp
-from .Adam import Adam
+import importlib
+
+# Optimizers are imported on first access, e.g. simplegrad.algo.optimize.Adam
+_optimizers = ("GD", "Newton", "NewtonCG", "Momentum", "RMSProp", "Adam")
+
+__all__ = list(_optimizers)
+
+
+def __getattr__(name):
+    if name in _optimizers:
+        optimizer = getattr(importlib.import_module(f".{name}", __name__), name)
+        globals()[name] = optimizer
+        return optimizer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
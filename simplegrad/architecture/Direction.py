@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class Direction:
+    """
+    Tangent vector over several variables. gradientGraph(by=direction) is
+    the derivative along it: every variable is differentiated into its
+    tangent, a leaf whose value is assigned before forward, so one
+    derivative graph serves every direction
+    """
+
+    def __init__(self, variables: list):
+        from simplegrad.architecture.Graph import GraphBase
+        from simplegrad.implementation.primitives.Variable import Variable
+
+        self.id = next(GraphBase._ids)
+        self._tangents = {}
+        # Bits of the variables, as in masks of nodes depending on them
+        self._variables_mask = 0
+        for var in variables:
+            tangent = Variable(np.zeros(var.shape), requires_grad=False, def_name="tangent")
+            self._tangents[var.id] = tangent
+            self._variables_mask |= var._variables_mask
+
+    def tangent(self, variable):
+        """
+        :return: tangent leaf of variable, None if it is not in the direction
+        """
+        return self._tangents.get(variable.id)
+
+    def assign(self, vectors: list):
+        """
+        :param vectors: tangent value of every variable, in order of creation
+        """
+        assert len(vectors) == len(self._tangents), "Expected one vector per variable"
+        for tangent, vector in zip(self._tangents.values(), vectors):
+            assert np.shape(vector) == tangent.shape, \
+                f"Tangent of shape {tangent.shape} expected, got {np.shape(vector)}"
+            tangent.value = vector
@@ -0,0 +1,51 @@
+def fuseElementwise(root, nodes: list, children=lambda node: node._children) -> list:
+    """
+    Graph optimization pass of the compiled tape: maximal chains of
+    elementwise nodes, where every node but the last is used only by
+    the next one, are replaced with a single FusedNode. Nodes of a chain
+    have equal shapes and all depend on mutable leaves, so constant
+    subexpressions are still evaluated once by the tape
+
+    :param root: graph output, never fused into a chain
+    :param nodes: topologically sorted nodes of the graph
+    :param children: children of a node (see Rewrite)
+    :return: topologically sorted nodes with chains replaced
+    """
+    from simplegrad.implementation.operations.FusedNode import FusedNode
+
+    consumers = {node.id: set() for node in nodes}
+    dynamic = {}
+    for node in nodes:
+        for child in children(node):
+            consumers[child.id].add(node.id)
+        dynamic[node.id] = node._mutable or any([dynamic[child.id] for child in children(node)])
+
+    byId = {node.id: node for node in nodes}
+
+    def fusable(node) -> bool:
+        if not node._elementwise or node.id == root.id or len(consumers[node.id]) != 1:
+            return False
+        consumer = byId[next(iter(consumers[node.id]))]
+        return consumer._elementwise and consumer.shape == node.shape \
+            and dynamic[node.id] and dynamic[consumer.id]
+
+    # Chain of a node is the chain of its only consumer
+    chains = {}
+    for node in reversed(nodes):
+        if fusable(node):
+            chains[node.id] = chains[next(iter(consumers[node.id]))]
+        else:
+            chains[node.id] = node.id
+
+    members = {}
+    for node in nodes:
+        members.setdefault(chains[node.id], []).append(node)
+
+    fused = []
+    for node in nodes:
+        chain = members[chains[node.id]]
+        if len(chain) == 1:
+            fused.append(node)
+        elif node is chain[-1]:
+            fused.append(FusedNode(chain, children))
+    return fused
@@ -1,20 +1,84 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 import numpy as np
-import uuid
-import graphviz
+import itertools
+import os
+
+from simplegrad.architecture.Direction import Direction
+from simplegrad.architecture.Precision import getPrecision
+from simplegrad.architecture.Profiler import getProfiler
+from simplegrad.architecture.Traversal import ExecutionPlan, postOrder
+from simplegrad.architecture.Tape import CompiledGraph
+
+if TYPE_CHECKING:
+    import graphviz
 
 
 class GraphBase(ABC):
     """
     Base metaclass for simplegrad
-    defines node in computational graph
+    defines node in computational graph.
+    Nodes have slots instead of __dict__ and integer ids, so graphs
+    of hundreds of thousands of nodes stay small and cheap to build
     """
+    __slots__ = ("_id", "_dtype", "_shape", "_children", "_grad", "_grads_dirty", "_frwd", "_stamp",
+                 "_frwd_shape_version", "_requires_grad", "_variables_mask", "_batched", "_plan", "_compiled",
+                 "_directional", "_derivatives", "_constant", "_checkpoint")
+
+    # Ids of nodes and Directions, unique within the process
+    _ids = itertools.count()
+
+    # Stamps of forward computations, increasing within the process
+    _clock = itertools.count(1)
+
+    # Bumped whenever graph structure changes after construction
+    # (e.g. requires_grad of a variable is toggled), invalidates cached plans
+    _structure_version = 0
+
+    # False for nodes that never propagate gradient to children
+    _differentiable = True
+
+    # True for leaves whose value may change after construction
+    _mutable = False
+
+    # True for leaves whose shape may change after construction
+    _reshapeable = False
+
+    # True for leaves stored in master dtype of the precision policy
+    _master = False
 
-    def __init__(self, id: uuid.UUID = None):
+    # True for variables whose value and gradient are views into
+    # a ParameterBuffer, compiled tapes keep their gradient buffer
+    _packed = False
+
+    # False for nodes whose kernels modify shared state (e.g. windows of
+    # placeholders), a parallel tape never runs two of them at once
+    _threadSafe = True
+
+    # True for nodes computing every output element from the same element
+    # of inputs of output shape, chains of them are fused by compile()
+    _elementwise = False
+
+    # NumPy ufunc equal to the forward kernel, lets fused chains
+    # write into reused buffers
+    _ufunc = None
+
+    # Set by derivativeReport() to build derivatives without
+    # memoization and simplification: derivatives by node id,
+    # built children first and taken by the first parent using them
+    _naiveDerivatives = None
+
+    def __init__(self, id: int = None):
         if id is None:
-            id = uuid.uuid4()
+            id = next(GraphBase._ids)
         self._id = id
 
+        # Dtype of value and gradient, fixed by the policy active at creation
+        policy = getPrecision()
+        self._dtype = policy.master if self._master else policy.compute
+
         # Output _shape
         self._shape = None
 
@@ -22,90 +86,304 @@ class GraphBase(ABC):
         self._children = []
 
         self._grad = None
+        self._grads_dirty = False
         self._frwd = None
+        # Stamp of the last computation of _frwd, a node is outdated once
+        # a child was computed after it, whichever graph the child was computed for
+        self._stamp = 0
+        self._frwd_shape_version = 0
         self._requires_grad = False
-        self._variables_set = set()
-        self._topo_visited = False
-        self._topo_visited_cache = None
+        # Bit of every variable below the node, see Variable
+        self._variables_mask = 0
+        # True below a Placeholder, rows of the node may follow fed values
+        self._batched = False
+        self._plan = None
+        self._compiled = None
+        # Directional derivatives used by hvp(), see _directionalTape()
+        self._directional = None
+        # gradientGraph() results by (variable or Direction id, shape)
+        self._derivatives = None
+        # Value of every element of constants created by symbolic
+        # differentiation (zeros and ones), None for other nodes
+        self._constant = None
+        # True for nodes ending a segment of tapes compiled with
+        # checkpoint="marked", their values are kept after forward
+        self._checkpoint = False
 
     def _checkRequiresGrad(self):
         self._requires_grad = False
-        self._variables_set = set()
+        self._batched = self._reshapeable
+        mask = 0
         for child in self._children:
-            self._variables_set = self._variables_set.union(child._variables_set)
+            self._batched = self._batched or child._batched
+            union = mask | child._variables_mask
+            # Mask of a child covering all variables is shared, not copied
+            if union == child._variables_mask:
+                mask = child._variables_mask
+            elif union != mask:
+                mask = union
             if child._requires_grad:
                 self._requires_grad = True
+        self._variables_mask = mask
+
+    @staticmethod
+    def _invalidateStructure():
+        GraphBase._structure_version += 1
+
+    def _executionPlan(self, invalidated=False) -> ExecutionPlan:
+        if self._plan is None or invalidated \
+                or self._plan.version != GraphBase._structure_version:
+            self._plan = ExecutionPlan(self, GraphBase._structure_version)
+        self._plan.refreshShapes()
+        return self._plan
+
+    def _inferShape(self) -> tuple:
+        """
+        Output shape computed from current children shapes
+        """
+        return self._shape
+
+    def _cseKey(self):
+        """
+        Parameters that, together with type and children, determine the node value.
+        Nodes with equal keys are computed once by the compiled tape,
+        None (the default) if the node must never be merged with another one
+        """
+        return None
 
     @abstractmethod
-    def forward(self) -> np.ndarray:
+    def _forwardKernel(self, *inputs) -> np.ndarray:
+        """
+        Computes node value from children forward values
+        """
         pass
 
     @abstractmethod
-    def _backward(self):
+    def _backwardKernel(self, grad, frwd, *inputs) -> tuple:
+        """
+        :param grad: gradient of the node
+        :param frwd: node forward value
+        :param inputs: children forward values
+        :return: gradient for every child, None if child gets no gradient
+        """
         pass
 
-    def backward(self, ignore_warnings=False):
+    def _tangentKernel(self, tangents, frwd, *inputs) -> np.ndarray:
+        """
+        Forward-mode rule: tangent of the node from tangents of its children
+
+        :param tangents: tangent of every child, None if it is zero
+        :param frwd: node forward value
+        :param inputs: children forward values
+        :return: tangent of the node, None if it is zero
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not define forward-mode derivative")
+
+    def _forward(self):
+        self._frwd = self._forwardKernel(*[child._frwd for child in self._children])
+
+    def _outdated(self) -> bool:
+        """
+        True if the node must be recomputed even if its children did not change
+        """
+        return self._frwd is None
+
+    def forward(self) -> np.ndarray:
+        """
+        Recomputes only nodes computed before one of their children,
+        i.e. downstream of leaves that changed since they were last evaluated
+        by forward of any graph sharing them
+        """
+        plan = self._executionPlan()
+        profiler = getProfiler()
+        # After shapes were re-inferred every node is recomputed
+        reshaped = plan.shapeVersion != self._frwd_shape_version
+        for node in plan.nodes:
+            stamp = node._stamp
+            if not (reshaped or node._outdated() or any([child._stamp > stamp for child in node._children])):
+                continue
+            if profiler is None:
+                node._forward()
+            else:
+                profiler.measure(node, "forward", lambda: node._forward() or node._frwd)
+            node._stamp = next(GraphBase._clock)
+        self._frwd_shape_version = plan.shapeVersion
+        return self._frwd
+
+    def _backward(self):
+        self._buildGrad()
+        if not self._requires_grad or not self._differentiable:
+            return
+        grads = self._backwardKernel(self._grad, self._frwd, *[child._frwd for child in self._children])
+        for child, grad in zip(self._children, grads):
+            if grad is not None:
+                child._grad += grad
+
+    def backward(self, ignore_warnings=False, seed=None):
+        """
+        :param seed: gradient of the root, ones if not given
+        """
         assert not self._frwd is None, "Forward propagation must be called before"
         topo = self.topoSorted()
-        if self._grad is not None and not ignore_warnings:
+        if self._grads_dirty and not ignore_warnings:
             print("[ Simplegrad ] Warning: running backward without zeroing gradients")
-        self._grad = np.ones(self.shape)
-        invalidated = False
+        if self._grad is None or self._grad.shape != self.shape:
+            self._grad = np.empty(self.shape, dtype=self._dtype)
+        if seed is None:
+            self._grad.fill(1)
+        else:
+            np.copyto(self._grad, seed)
+        profiler = getProfiler()
         for v in reversed(topo):
-            if not v._topo_visited:
-                invalidated = True
-            v._backward()
-
-        if invalidated:
-            if not ignore_warnings:
-                print("[ Simplegrad ] Info: rebuilding topo structure")
-            self.topoSorted(invalidated=True)
-            self.zeroGrad()
-            self.backward(ignore_warnings=ignore_warnings)
+            if profiler is None:
+                v._backward()
+            else:
+                profiler.measure(v, "backward", v._backward)
+        self._grads_dirty = True
+
+    def jvp(self, variables: list, tangents: list) -> tuple:
+        """
+        Forward-mode derivative: tangents of leaves are propagated node by node
+        next to forward values, no graph is built. Cheaper than backward
+        when there are few directions and many outputs
+
+        :param variables: leaves (variables or placeholders) with nonzero tangent
+        :param tangents: arrays of shapes of leaves
+        :return: graph value and its derivative along tangents
+        """
+        value = self.forward()
+        seeds = {}
+        for var, tangent in zip(variables, tangents):
+            assert np.shape(tangent) == var.shape, f"Tangent of shape {var.shape} expected, got {np.shape(tangent)}"
+            seeds[var.id] = tangent
+        dots = {}
+        for node in self._executionPlan().nodes:
+            if node.id in seeds:
+                dots[node.id] = np.asarray(seeds[node.id], dtype=node._frwd.dtype)
+                continue
+            childDots = [dots.get(child.id) for child in node._children]
+            if any([dot is not None for dot in childDots]):
+                dots[node.id] = node._tangentKernel(childDots, node._frwd, *[child._frwd for child in node._children])
+        tangent = dots.get(self.id)
+        if tangent is None:
+            tangent = np.zeros(self.shape, dtype=value.dtype)
+        return value, tangent
+
+    def hvp(self, variables: list, vectors: list) -> list:
+        """
+        Hessian-vector product of a scalar graph: second derivative by variables
+        applied to the vector made of one array per variable. Computed as the
+        gradient of the derivative along vectors (see Direction), whose graph is
+        built once per variables and input shapes. Gradients of variables
+        are left untouched
+
+        :param variables: variables of the Hessian
+        :param vectors: arrays of shapes of variables
+        :return: product split into arrays of shapes of variables
+        """
+        assert self.shape == (1, 1), "Hessian-vector product needs scalar graph"
+        direction, tape = self._directionalTape(variables)
+        direction.assign(vectors)
+        result = []
+        if tape is not None:
+            tape.zeroGrad()
+            tape.forward()
+            tape.backward()
+        for var in variables:
+            grad = None if tape is None else tape.grad(var)
+            result.append(np.zeros(var.shape, dtype=var._dtype) if grad is None else grad.copy())
+        return result
+
+    def _directionalTape(self, variables: list) -> tuple:
+        """
+        :return: Direction over variables and tape of the derivative along it,
+                 None if the derivative does not depend on variables
+        """
+        if self._directional is None:
+            self._directional = {}
+        plan = self._executionPlan()
+        # Zero derivatives of inputs are constants of input shape
+        key = (tuple(var.id for var in variables),
+               tuple(node.shape for node in plan.nodes if node._reshapeable))
+        if key not in self._directional:
+            direction = Direction(variables)
+            self._directional[key] = (direction, self.gradientGraph(by=direction), None)
+        direction, derivative, tape = self._directional[key]
+        if not derivative.requires_grad:
+            return direction, None
+        derivativePlan = derivative._executionPlan()
+        if tape is None or tape.plan is not derivativePlan:
+            tape = CompiledGraph(derivative, derivativePlan, writeback=False)
+            self._directional[key] = (direction, derivative, tape)
+        return direction, tape
+
+    def _dependsOn(self, by) -> bool:
+        """
+        :param by: variable or Direction of gradientGraph()
+        """
+        return bool(self._variables_mask & by._variables_mask)
+
+    def _lossScaling(self) -> bool:
+        """
+        True if the graph computes in a dtype too narrow for small gradients
+        """
+        return self._dtype.itemsize < 4
 
     def topoSorted(self, onlygrad=True, invalidated=False) -> list:
-        if self._topo_visited_cache is not None \
-                and self._topo_visited and not invalidated and onlygrad:
-            return self._topo_visited_cache
-        self._topo_visited_cache = None
-        self._topo_visited = False
-
-        topo = []
-        visited = set()
-
-        def build_topo(v):
-            v._topo_visited = True
-            if v.id not in visited:
-                visited.add(v.id)
-                for child in v._children:
-                    build_topo(child)
-                if v._requires_grad or not onlygrad:
-                    topo.append(v)
-
-        build_topo(self)
-
+        plan = self._executionPlan(invalidated=invalidated)
         if onlygrad:
-            self._topo_visited_cache = topo
-        return topo
+            return plan.gradNodes
+        return plan.nodes
 
     def zeroGrad(self):
-        visited = set()
-
-        def visitor(v):
-            if v.id not in visited:
-                v._grad = None
-                for child in v._children:
-                    visitor(child)
-
-        visitor(self)
+        """
+        Zeroes gradient buffers in place, they are reused by the next backward
+        """
+        for node in self._executionPlan().nodes:
+            if node._grad is not None:
+                node._grad.fill(0)
+        self._grads_dirty = False
+
+    def compile(self, workers=None, checkpoint=None) -> CompiledGraph:
+        """
+        Flattens the graph into a tape of kernels with preassigned buffer slots.
+        The tape is cached and rebuilt only when the graph structure changes
+
+        :param workers: evaluate independent kernels on a pool of that many threads
+        :param checkpoint: recompute intermediate values in backward instead of keeping them,
+                           segment length in kernels or "marked" (see checkpoint())
+        """
+        plan = self._executionPlan()
+        compiled = self._compiled
+        if compiled is None or compiled.plan is not plan or compiled.workers != workers \
+                or compiled.checkpoint != checkpoint:
+            self._compiled = CompiledGraph(self, plan, workers=workers, checkpoint=checkpoint)
+        return self._compiled
+
+    def checkpoint(self):
+        """
+        Marks the node as the end of a segment of tapes compiled
+        with checkpoint="marked", its value is kept after forward
+        """
+        self._checkpoint = True
+        return self
 
     def _buildGrad(self):
         for child in self._children:
-            if child._grad is None:
-                child._grad = np.zeros(child.shape)
-
-    def _safeValue(self, value) -> np.ndarray:
-        value = np.array(value, dtype=float)
+            if child._grad is None or child._grad.shape != child.shape:
+                child._grad = np.zeros(child.shape, dtype=child._dtype)
+
+    def _safeValue(self, value, copy=False) -> np.ndarray:
+        """
+        Converts value to 2D array of node dtype. Arrays of that dtype
+        (including np.memmap) are used without copying unless copy is set,
+        path to .npy file is memory-mapped read-only
+        """
+        # Arrays skip the slower check of os.PathLike
+        if not isinstance(value, np.ndarray) and isinstance(value, (str, os.PathLike)):
+            value = np.load(value, mmap_mode='r')
+        if copy or not isinstance(value, np.ndarray) or value.dtype != self._dtype:
+            value = np.array(value, dtype=self._dtype)
         if len(value.shape) <= 1:
             value = np.reshape(value, (value.size, 1))
         return value
@@ -135,15 +413,80 @@ class GraphBase(ABC):
         self.forward()
         self.backward()
 
-    @abstractmethod
     def gradientGraph(self, by):
+        """
+        Symbolic derivative along by: variable (differentiated into ones)
+        or Direction. Results are memoized per node, so subgraphs shared
+        by nested derivatives are differentiated once. Derivatives
+        of nodes independent of by are constant zeros, zeros and ones
+        are propagated through sums and products
+
+        :param by: Variable or Direction
+        """
+        naive = GraphBase._naiveDerivatives
+        if naive is not None:
+            # Other parents using the node build their own copy of its derivative
+            derivative = naive.pop(self.id, None)
+            if derivative is None:
+                derivative = self._derivative(by)
+            return derivative
+        key = (by.id, self.shape)
+        if self._derivatives is None or key not in self._derivatives:
+            self._fillDerivatives(by)
+        return self._derivatives[key]
+
+    def _derivative(self, by):
+        if self._dependsOn(by):
+            return self._gradientGraph(by)
+        return self._constantGraph(self.shape, 0.0)
+
+    def _fillDerivatives(self, by):
+        """
+        Memoizes derivatives along by of nodes below, children first, so
+        _gradientGraph() of every node finds those of its children and
+        graphs of any depth are differentiated without deep recursion
+        """
+        def pending(node) -> bool:
+            return node._derivatives is None or (by.id, node.shape) not in node._derivatives
+
+        # Derivatives of nodes independent of by are zeros, their children are not needed
+        children = lambda node: [child for child in node._children if pending(child)] if node._dependsOn(by) else []
+        for node in postOrder(self, children):
+            if pending(node):
+                if node._derivatives is None:
+                    node._derivatives = {}
+                node._derivatives[(by.id, node.shape)] = node._derivative(by)
+
+    @abstractmethod
+    def _gradientGraph(self, by):
+        """
+        Derivative graph of a node depending on by
+        """
         pass
 
-    @property
-    def _prevFrwd(self):
-        if not self._frwd is None and not self._requires_grad:
-            return self._frwd
-        return None
+    def derivativeReport(self, by) -> dict:
+        """
+        Number of nodes of the derivative along by built naively, with every
+        term of product rules and no memoization, and by gradientGraph()
+        """
+        GraphBase._naiveDerivatives = naive = {}
+        try:
+            # Children first, as in _fillDerivatives(), so deep graphs do not recurse
+            for node in postOrder(self, lambda node: node._children if node._dependsOn(by) else []):
+                naive[node.id] = node.gradientGraph(by)
+            naive = naive[self.id]
+        finally:
+            GraphBase._naiveDerivatives = None
+        simplified = self.gradientGraph(by)
+        return {"naive": len(naive.topoSorted(onlygrad=False)),
+                "simplified": len(simplified.topoSorted(onlygrad=False))}
+
+    @staticmethod
+    def _constantGraph(shape: tuple, fill: float):
+        from simplegrad.implementation.primitives.Value import Value
+        node = Value(np.full(shape, fill))
+        node._constant = fill
+        return node
 
     @property
     def requires_grad(self):
@@ -170,8 +513,17 @@ class GraphBase(ABC):
             values += "\n" + self._gradString()
         return type(self).__name__ + f"\n{self.shape}" + values
 
-    def to_dot(self, show_grad=True, show_grad_values=False) -> graphviz.Digraph:
+    def to_dot(self, show_grad=True, show_grad_values=False, profiler=None) -> graphviz.Digraph:
+        """
+        :param profiler: Profiler whose timings shade nodes from white to red
+                         and are added to labels
+        """
+        # Imported on first use, evaluating graphs does not need it
+        import graphviz
+
         graph = graphviz.Digraph()
+        times = {} if profiler is None else profiler.nodeTimes()
+        slowest = max(list(times.values()) + [1e-12])
 
         for node in self.topoSorted(onlygrad=False):
             color = None
@@ -179,11 +531,16 @@ class GraphBase(ABC):
             if show_grad:
                 color = 'lightgreen' if node.requires_grad else "pink"
                 penwidth = '4'
+            label = node._dot_description(show_grad_values=show_grad_values)
+            fillcolor = 'white'
+            if node.id in times:
+                label += f"\n{times[node.id] * 1e3:.3f} ms"
+                fillcolor = f"0.0 {times[node.id] / slowest:.3f} 1.0"
             graph.node(node._dot_name(),
-                       label=node._dot_description(show_grad_values=show_grad_values),
+                       label=label,
                        color=color,
                        penwidth=penwidth,
-                       fillcolor='white',
+                       fillcolor=fillcolor,
                        style='filled'
                        )
             for child in node._children:
@@ -0,0 +1,62 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Pools by number of workers, shared by all tapes so compiling again
+# does not leave threads behind. Threads do not survive fork, forked
+# processes start their own pools
+_executors = {}
+_executorsLock = threading.Lock()
+os.register_at_fork(after_in_child=_executors.clear)
+
+
+def sharedExecutor(workers: int) -> ThreadPoolExecutor:
+    """
+    Thread pool with that many workers, created by the first tape using it
+    """
+    with _executorsLock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = ThreadPoolExecutor(workers)
+        return executor
+
+
+def runParallel(executor, waits: list, run, done, serial=()):
+    """
+    Runs tasks on a thread pool as soon as the tasks they wait for are done.
+    Results are handed to done() in the calling thread, so it may write
+    into shared buffers without locking
+
+    :param executor: concurrent.futures executor
+    :param waits: for every task, indices of tasks it waits for
+    :param run: run(i) computes task i in a worker thread
+    :param done: done(i, result) stores result of task i
+    :param serial: tasks that must not run concurrently with each other
+    """
+    lock = threading.Lock()
+
+    def runTask(i):
+        if i in serial:
+            with lock:
+                return run(i)
+        return run(i)
+
+    remaining = [len(before) for before in waits]
+    dependents = [[] for _ in waits]
+    for i, before in enumerate(waits):
+        for j in before:
+            dependents[j].append(i)
+
+    futures = {}
+    for i, count in enumerate(remaining):
+        if count == 0:
+            futures[executor.submit(runTask, i)] = i
+    while futures:
+        finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in finished:
+            i = futures.pop(future)
+            done(i, future.result())
+            for j in dependents[i]:
+                remaining[j] -= 1
+                if remaining[j] == 0:
+                    futures[executor.submit(runTask, j)] = j
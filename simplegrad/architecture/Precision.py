@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class Precision:
+    """
+    Dtype policy applied to nodes created while it is active.
+    Values, placeholders, intermediate results and their gradients use
+    compute dtype. Variables keep master weights, their gradients and
+    optimizer state in master dtype and are cast to compute dtype on forward.
+    float16 compute with float32 master weights is mixed precision,
+    optimizers then scale the loss (see BaseOptimizer)
+
+    Set globally with setPrecision() or for graphs built inside a with block:
+
+        with Precision("float32"):
+            model.fit(X, y)
+    """
+    _active = None
+    _stack = []
+
+    def __init__(self, compute="float64", master=None):
+        """
+        :param compute: dtype of forward values and gradients
+        :param master: dtype of variables, compute dtype if None
+        """
+        self.compute = np.dtype(compute)
+        self.master = self.compute if master is None else np.dtype(master)
+        assert np.issubdtype(self.compute, np.floating) and np.issubdtype(self.master, np.floating), \
+            "Precision dtypes must be floating"
+
+    @property
+    def mixed(self) -> bool:
+        return self.master != self.compute
+
+    def __enter__(self):
+        Precision._stack.append(Precision._active)
+        Precision._active = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        Precision._active = Precision._stack.pop()
+
+    def __repr__(self):
+        if self.mixed:
+            return f"Precision({self.compute}, master={self.master})"
+        return f"Precision({self.compute})"
+
+
+Precision._active = Precision()
+
+
+def getPrecision() -> Precision:
+    return Precision._active
+
+
+def setPrecision(compute="float64", master=None) -> Precision:
+    """
+    Sets global dtype policy for nodes created afterwards
+    """
+    Precision._active = Precision(compute, master=master)
+    return Precision._active
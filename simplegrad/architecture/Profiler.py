@@ -0,0 +1,192 @@
+import threading
+import time
+
+import numpy as np
+
+
+def _nbytes(result) -> int:
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, tuple):
+        return sum([_nbytes(item) for item in result])
+    return 0
+
+
+class Profiler:
+    """
+    Records wall time, number of calls and bytes of arrays returned by
+    kernels of every node, separately for forward, backward and recompute
+    (forward kernels rerun by checkpointed tapes). Temporaries allocated
+    inside kernels are not counted. Active inside a with block:
+
+        with sg.profile() as profiler:
+            model.fit(X, y)
+        print(profiler.to_table())
+
+    Statistics are aggregated per node, so their size does not grow with
+    the number of steps. Individual kernel calls for to_chrome_trace()
+    are kept only with trace=True, up to trace_limit of them
+
+    Graphs and compiled tapes look the profiler up once per forward or
+    backward, kernels are wrapped only while one is active. Nodes fused
+    by compile() are recorded as one node with id of the chain output
+    """
+    _active = None
+    _stack = []
+
+    def __init__(self, trace=False, trace_limit=100000):
+        """
+        :param trace: keep every kernel call for to_chrome_trace()
+        :param trace_limit: number of calls kept, later ones are counted in dropped
+        """
+        # (node id, phase) -> [name, op, calls, seconds, output bytes]
+        self._stats = {}
+        self._events = [] if trace else None
+        self._trace_limit = trace_limit
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def __enter__(self):
+        Profiler._stack.append(Profiler._active)
+        Profiler._active = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        Profiler._active = Profiler._stack.pop()
+
+    def measure(self, node, phase: str, fn, *args):
+        """
+        Calls fn(*args) and records it as a kernel of node
+        """
+        start = time.perf_counter()
+        result = fn(*args)
+        stop = time.perf_counter()
+        self._record(node, phase, start, stop, _nbytes(result))
+        return result
+
+    def wrap(self, kernel, phase: str):
+        """
+        :param kernel: bound kernel method of a node
+        :return: kernel recording its calls
+        """
+        node = kernel.__self__
+
+        def wrapped(*args):
+            return self.measure(node, phase, kernel, *args)
+
+        return wrapped
+
+    def wrapOps(self, ops: list, phase: str) -> list:
+        """
+        :param ops: tape operations with kernel as the first item
+        """
+        return [(self.wrap(op[0], phase),) + tuple(op[1:]) for op in ops]
+
+    def _record(self, node, phase, start, stop, bytes):
+        key = (node.id, phase)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                description = node._dot_description(False).split("\n")
+                stats = [" ".join(description), description[0], 0, 0.0, 0]
+                self._stats[key] = stats
+            stats[2] += 1
+            stats[3] += stop - start
+            stats[4] += bytes
+            if self._events is None:
+                return
+            if len(self._events) < self._trace_limit:
+                self._events.append((stats[0], phase, start, stop, threading.get_ident()))
+            else:
+                self.dropped += 1
+
+    def nodes(self) -> list:
+        """
+        :return: statistics of every node and phase, slowest first
+        """
+        rows = [{"id": str(id), "name": name, "op": op, "phase": phase,
+                 "calls": calls, "time": seconds, "output_bytes": bytes}
+                for (id, phase), (name, op, calls, seconds, bytes) in self._stats.items()]
+        return sorted(rows, key=lambda row: row["time"], reverse=True)
+
+    def ops(self) -> list:
+        """
+        :return: statistics summed over nodes of every op type and phase, slowest first
+        """
+        totals = {}
+        for row in self.nodes():
+            key = (row["op"], row["phase"])
+            if key not in totals:
+                totals[key] = {"op": row["op"], "phase": row["phase"], "nodes": 0, "calls": 0, "time": 0.0,
+                               "output_bytes": 0}
+            total = totals[key]
+            total["nodes"] += 1
+            total["calls"] += row["calls"]
+            total["time"] += row["time"]
+            total["output_bytes"] += row["output_bytes"]
+        return sorted(totals.values(), key=lambda row: row["time"], reverse=True)
+
+    def nodeTimes(self) -> dict:
+        """
+        :return: seconds spent in every node over all phases, by node id
+        """
+        times = {}
+        for (id, phase), stats in self._stats.items():
+            times[id] = times.get(id, 0.0) + stats[3]
+        return times
+
+    def to_table(self, by="op", limit=None) -> str:
+        """
+        :param by: "op" for totals of op types, "node" for every node
+        :param limit: number of slowest rows shown
+        """
+        rows = self.ops() if by == "op" else self.nodes()
+        key = "op" if by == "op" else "name"
+        rows = rows[:limit]
+        width = max([len(row[key]) for row in rows] + [len(key)])
+        lines = [f"{key:<{width}}  {'phase':<9}  {'calls':>7}  {'time ms':>10}  {'output MB':>9}"]
+        for row in rows:
+            lines.append(f"{row[key]:<{width}}  {row['phase']:<9}  {row['calls']:>7}  "
+                         f"{row['time'] * 1e3:>10.3f}  {row['output_bytes'] / 2 ** 20:>9.3f}")
+        return "\n".join(lines)
+
+    def to_json(self, path=None) -> str:
+        """
+        :param path: file the JSON is written to
+        """
+        import json
+
+        text = json.dumps({"ops": self.ops(), "nodes": self.nodes()}, indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+    def to_chrome_trace(self, path):
+        """
+        Writes every recorded kernel call in the trace event format,
+        viewable in chrome://tracing or Perfetto. Needs Profiler(trace=True)
+        """
+        import json
+
+        assert self._events is not None, "Kernel calls are kept only by profile(trace=True)"
+
+        events = [{"name": name, "cat": phase, "ph": "X", "pid": 0, "tid": thread,
+                   "ts": (start - self._origin) * 1e6, "dur": (stop - start) * 1e6}
+                  for name, phase, start, stop, thread in self._events]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+def getProfiler() -> Profiler:
+    return Profiler._active
+
+
+def profile(trace=False, trace_limit=100000) -> Profiler:
+    """
+    Profiler recording kernels of graphs evaluated inside a with block
+
+    :param trace: keep every kernel call for to_chrome_trace(), see Profiler
+    """
+    return Profiler(trace=trace, trace_limit=trace_limit)
@@ -0,0 +1,102 @@
+from simplegrad.architecture.Precision import Precision
+
+
+class Rewrite:
+    """
+    Graph rewriting pass of the compiled tape. The graph itself is not
+    modified: removed nodes are mapped to the node computing the same value.
+    - identical subexpressions, hashed by (type, parameters, children),
+      are computed once
+    - subgraphs built only from immutable leaves are folded into one Value
+    - broadcasts to the shape of their input are skipped
+
+    Rewrites of broadcasts depend on current shapes, valid() tells
+    whether they still hold after inputs were fed with another shape
+    """
+
+    def __init__(self, root, nodes: list):
+        from simplegrad.implementation.operations.BroadcastNode import BroadcastNode
+        from simplegrad.implementation.primitives.Value import Value
+
+        self._substitutes = {}
+        # Pairs of nodes whose equal shapes justify a rewrite
+        self._shapeChecks = []
+        self.duplicates = 0
+        self.folded = 0
+        self.broadcasts = 0
+
+        known = {}
+        dynamic = {}
+        for node in nodes:
+            children = self.children(node)
+            dynamic[node.id] = node._mutable or any([dynamic[child.id] for child in children])
+            isBroadcast = isinstance(node, BroadcastNode)
+
+            if isBroadcast and node.id != root.id and children[0].shape == node.shape:
+                self._substitute(node, children[0])
+                self._shapeChecks.append((node, children[0]))
+                self.broadcasts += 1
+                continue
+
+            if children and not dynamic[node.id]:
+                with Precision(node._dtype):
+                    value = Value(node.forward())
+                value._id = node.id
+                self._substitute(node, value)
+                node = value
+                isBroadcast = False
+                self.folded += 1
+
+            params = node._cseKey()
+            if params is None:
+                continue
+            key = (type(node), params, tuple(child.id for child in self.children(node)))
+            if key in known:
+                self._substitute(node, known[key])
+                if isBroadcast:
+                    self._shapeChecks.append((node, known[key]))
+                self.duplicates += 1
+            else:
+                known[key] = node
+
+        self.nodes = self._reachable(root, nodes)
+        self.removed = len(nodes) - len(self.nodes)
+
+    def _substitute(self, node, substitute):
+        self._substitutes[node.id] = self.canonical(substitute)
+
+    def canonical(self, node):
+        return self._substitutes.get(node.id, node)
+
+    def children(self, node) -> list:
+        return [self.canonical(child) for child in node._children]
+
+    def _reachable(self, root, nodes: list) -> list:
+        reached = {self.canonical(root).id}
+        for node in reversed(nodes):
+            node = self.canonical(node)
+            if node.id in reached:
+                reached.update([child.id for child in self.children(node)])
+        result = []
+        for node in nodes:
+            node = self.canonical(node)
+            if node.id in reached:
+                reached.discard(node.id)
+                result.append(node)
+        return result
+
+    def aliases(self) -> dict:
+        """
+        Removed node id to the id of the node computing its value
+        """
+        return {id: node.id for id, node in self._substitutes.items() if id != node.id}
+
+    def valid(self) -> bool:
+        return all([left.shape == right.shape for left, right in self._shapeChecks])
+
+    @property
+    def report(self) -> dict:
+        return {"removed": self.removed,
+                "duplicates": self.duplicates,
+                "folded": self.folded,
+                "broadcasts": self.broadcasts}
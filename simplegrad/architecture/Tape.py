@@ -0,0 +1,410 @@
+import numpy as np
+
+from simplegrad.architecture.Fusion import fuseElementwise
+from simplegrad.architecture.Profiler import getProfiler
+from simplegrad.architecture.Rewrite import Rewrite
+
+
+class CompiledGraph:
+    """
+    Graph flattened into a linear list of kernels.
+    Every node gets a buffer slot, forward and backward
+    run as a loop over slots without recursion.
+    Forward value of the root and gradients of the leaves
+    are written back to the nodes, intermediate values
+    are kept in the tape (see value() and grad()).
+    The graph is simplified before it is flattened (see Rewrite),
+    chains of elementwise nodes are fused into one kernel (see Fusion).
+    With workers, kernels whose inputs are ready run on a thread pool
+    shared by tapes with the same number of workers,
+    NumPy releases the GIL in large operations, so independent
+    branches of wide graphs are evaluated concurrently.
+    With checkpoint, kernels are split into segments and only values
+    used across segments are kept after forward, backward recomputes
+    the rest segment by segment and frees interior gradients once
+    they are consumed, so memory no longer grows with graph depth.
+    Kernels are recorded by the active Profiler, if any
+    """
+
+    def __init__(self, root, plan, writeback=True, fuse=True, optimize=True, workers=None, checkpoint=None):
+        """
+        :param checkpoint: segment length in kernels, or "marked" to end
+                           segments at nodes marked by Graph.checkpoint()
+        """
+        assert not (workers and checkpoint), "Checkpointed tapes run kernels sequentially"
+        self.plan = plan
+        self._root = root
+        self._writeback = writeback
+        # Fused chains keep buffers of their intermediate values
+        self._fuse = fuse and not checkpoint
+        self._optimize = optimize
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self._executor = None
+        if workers:
+            # Imported by the first parallel tape, most processes never need threads
+            from simplegrad.architecture.Parallel import sharedExecutor
+            self._executor = sharedExecutor(workers)
+        self._build()
+
+    def _build(self):
+        root = self._root
+        plan = self.plan
+        self._rewrite = Rewrite(root, plan.nodes) if self._optimize else None
+        if self._rewrite is None:
+            nodes = plan.nodes
+            children = lambda node: node._children
+        else:
+            nodes = self._rewrite.nodes
+            children = self._rewrite.children
+        if self._fuse:
+            nodes = fuseElementwise(root, nodes, children)
+        self._nodes = nodes
+        self._gradNodes = [node for node in nodes if node._requires_grad]
+        self._slots = {node.id: i for i, node in enumerate(nodes)}
+        if self._rewrite is not None:
+            # Removed nodes share the slot of the node computing their value
+            for id, substitute in self._rewrite.aliases().items():
+                if substitute in self._slots:
+                    self._slots[id] = self._slots[substitute]
+        self._rootSlot = self._slots[root.id]
+        self._values = [None] * len(nodes)
+
+        # Nodes downstream of mutable leaves are recomputed when one
+        # of the leaves changes its version, the rest is evaluated once
+        self._dirty = [False] * len(nodes)
+        self._leafOps = []
+        self._forwardOps = []
+        self._constantOps = []
+        for i, node in enumerate(nodes):
+            inputs = tuple(self._slots[child.id] for child in children(node))
+            if node._mutable:
+                self._leafOps.append((node, i))
+                self._dirty[i] = True
+            elif any([self._dirty[j] for j in inputs]):
+                self._forwardOps.append((node._forwardKernel, i, inputs))
+                self._dirty[i] = True
+            else:
+                self._constantOps.append((node._forwardKernel, i, inputs))
+        self._evaluateConstants()
+        self._leafVersions = {slot: None for node, slot in self._leafOps}
+        self._segments = None
+        if self.checkpoint:
+            self._buildSegments()
+
+        # Gradient buffers are allocated once and reused by every backward,
+        # checkpointed tapes allocate interior ones when they are first written
+        self._grads = [None] * len(nodes)
+        for node in self._gradNodes:
+            if self._segments is not None and node._children:
+                continue
+            if node._packed and self._writeback:
+                self._grads[self._slots[node.id]] = node._grad
+            else:
+                self._grads[self._slots[node.id]] = np.zeros(node.shape, dtype=node._dtype)
+        self._grads[self._rootSlot] = np.ones(root.shape, dtype=root._dtype)
+
+        # Interior node gradient is overwritten by its first writer,
+        # so it never has to be zeroed. Leaf gradients are accumulated
+        # and zeroed in place by zeroGrad()
+        self._backwardOps = []
+        live = {self._rootSlot}
+        written = set()
+        for node in reversed(self._gradNodes):
+            out = self._slots[node.id]
+            if not node._children or not node._differentiable or out not in live:
+                continue
+            inputs = tuple(self._slots[child.id] for child in children(node))
+            edges = []
+            for child in children(node):
+                if not child._requires_grad:
+                    edges.append(None)
+                    continue
+                slot = self._slots[child.id]
+                edges.append((slot, bool(child._children) and slot not in written))
+                live.add(slot)
+                written.add(slot)
+            self._backwardOps.append((node._backwardKernel, out, inputs, tuple(edges)))
+
+        self._leaves = [(node, self._slots[node.id]) for node in self._gradNodes if not node._children]
+        # Used by parallel evaluation
+        self._interior = set([self._slots[node.id] for node in nodes if node._children])
+        self._serial = set([self._slots[node.id] for node in nodes if not node._threadSafe])
+        self._zeroed = True
+        self._shapeVersion = plan.shapeVersion
+        self._buffersOutdated = False
+
+    def _buildSegments(self):
+        segments = [[]]
+        for op in self._forwardOps:
+            segments[-1].append(op)
+            out = op[1]
+            if self.checkpoint == "marked":
+                ends = self._nodes[out]._checkpoint
+            else:
+                ends = len(segments[-1]) == self.checkpoint
+            if ends:
+                segments.append([])
+        if not segments[-1]:
+            segments.pop()
+        self._segments = segments
+        self._segmentOf = {out: s for s, ops in enumerate(segments) for kernel, out, inputs in ops}
+        # Values read by a later segment are checkpoints, the rest is released
+        kept = {self._rootSlot}
+        for s, ops in enumerate(segments):
+            for kernel, out, inputs in ops:
+                kept.update([i for i in inputs if self._segmentOf.get(i, s) != s])
+        self._released = [[out for kernel, out, inputs in ops if out not in kept] for ops in segments]
+
+    @property
+    def root(self):
+        return self._root
+
+    def _evaluateConstants(self):
+        values = self._values
+        for kernel, out, inputs in self._constantOps:
+            values[out] = kernel(*[values[i] for i in inputs])
+
+    @property
+    def report(self) -> dict:
+        """
+        Number of nodes removed by the rewriting pass, in total and per rewrite
+        """
+        if self._rewrite is None:
+            return {}
+        return self._rewrite.report
+
+    def _checkShapes(self):
+        self.plan.refreshShapes()
+        if self._shapeVersion == self.plan.shapeVersion:
+            return
+        if self._rewrite is not None and not self._rewrite.valid():
+            # Rewrites relied on shapes of broadcasts that changed
+            self._build()
+            return
+        # Inputs were fed with another batch size: constants may be broadcast
+        # to other shapes, every node is recomputed and gradient buffers
+        # are reallocated by the next backward
+        self._shapeVersion = self.plan.shapeVersion
+        self._evaluateConstants()
+        for slot in self._leafVersions:
+            self._leafVersions[slot] = None
+        self._buffersOutdated = True
+
+    def _reallocateBuffers(self):
+        for node in self._gradNodes:
+            slot = self._slots[node.id]
+            # Shapes of values, node shapes may be left at the last block of a chunked sum
+            shape = np.shape(self._values[slot])
+            if self._grads[slot] is not None and self._grads[slot].shape != shape:
+                self._grads[slot] = np.zeros(shape, dtype=node._dtype)
+        root = self._grads[self._rootSlot]
+        if root.shape != self._root.shape:
+            self._grads[self._rootSlot] = np.ones(self._root.shape, dtype=self._root._dtype)
+        self._buffersOutdated = False
+
+    def forward(self) -> np.ndarray:
+        self._checkShapes()
+        values = self._values
+        dirty = self._dirty
+        versions = self._leafVersions
+        for node, slot in self._leafOps:
+            dirty[slot] = versions[slot] != node._version
+            if dirty[slot]:
+                values[slot] = node._forwardKernel()
+                versions[slot] = node._version
+        profiler = getProfiler()
+        forwardOps = self._forwardOps if profiler is None else profiler.wrapOps(self._forwardOps, "forward")
+        if self._executor is not None:
+            self._parallelForward(forwardOps)
+        elif self._segments is not None:
+            for s, ops in enumerate(self._segments):
+                self._recompute(ops if profiler is None else profiler.wrapOps(ops, "forward"))
+                self._release(s)
+        else:
+            for kernel, out, inputs in forwardOps:
+                dirty[out] = any([dirty[i] for i in inputs])
+                if dirty[out]:
+                    values[out] = kernel(*[values[i] for i in inputs])
+        if self._writeback:
+            self._root._frwd = values[self._rootSlot]
+        return values[self._rootSlot]
+
+    def backward(self, ignore_warnings=False, seed=None):
+        """
+        :param seed: gradient of the root, ones if not given
+        """
+        values = self._values
+        grads = self._grads
+        assert values[self._rootSlot] is not None, "Forward propagation must be called before"
+        if not self._zeroed and not ignore_warnings:
+            print("[ Simplegrad ] Warning: running backward without zeroing gradients")
+        if self._buffersOutdated:
+            self._reallocateBuffers()
+        if seed is None:
+            grads[self._rootSlot].fill(1)
+        else:
+            np.copyto(grads[self._rootSlot], seed)
+
+        profiler = getProfiler()
+        backwardOps = self._backwardOps if profiler is None else profiler.wrapOps(self._backwardOps, "backward")
+        if self._executor is not None:
+            self._parallelBackward(backwardOps)
+        elif self._segments is not None:
+            self._checkpointedBackward(backwardOps, profiler)
+        else:
+            for kernel, out, inputs, edges in backwardOps:
+                childGrads = kernel(grads[out], values[out], *[values[i] for i in inputs])
+                for edge, childGrad in zip(edges, childGrads):
+                    if edge is None:
+                        continue
+                    slot, overwrite = edge
+                    self._accumulate(slot, childGrad, overwrite)
+
+        if self._writeback:
+            for node, slot in self._leaves:
+                node._grad = grads[slot]
+        self._zeroed = False
+
+    def _recompute(self, ops):
+        """
+        Evaluates kernels of a checkpointed segment whose values changed or were released
+        """
+        values = self._values
+        dirty = self._dirty
+        for kernel, out, inputs in ops:
+            dirty[out] = any([dirty[i] for i in inputs])
+            if dirty[out] or values[out] is None:
+                values[out] = kernel(*[values[i] for i in inputs])
+
+    def _release(self, segment):
+        for slot in self._released[segment]:
+            self._values[slot] = None
+
+    def _checkpointedBackward(self, backwardOps, profiler):
+        values = self._values
+        grads = self._grads
+        current = None
+        for kernel, out, inputs, edges in backwardOps:
+            # Kernels are in reverse order, so segments are entered one after another
+            segment = self._segmentOf.get(out)
+            if segment != current:
+                if current is not None:
+                    self._release(current)
+                if segment is not None:
+                    ops = self._segments[segment]
+                    self._recompute(ops if profiler is None else profiler.wrapOps(ops, "recompute"))
+                current = segment
+            childGrads = kernel(grads[out], values[out], *[values[i] for i in inputs])
+            for edge, childGrad in zip(edges, childGrads):
+                if edge is None:
+                    continue
+                slot, overwrite = edge
+                self._accumulate(slot, childGrad, overwrite)
+            if out != self._rootSlot:
+                grads[out] = None
+        if current is not None:
+            self._release(current)
+
+    def _accumulate(self, slot, grad, overwrite):
+        grads = self._grads
+        if grads[slot] is None:
+            # Value of a child is recomputed or kept when its parent runs backward
+            grads[slot] = np.empty(np.shape(self._values[slot]), dtype=self._nodes[slot]._dtype)
+        if grad is None:
+            if overwrite:
+                grads[slot].fill(0)
+        elif overwrite:
+            np.copyto(grads[slot], grad)
+        else:
+            np.add(grads[slot], grad, out=grads[slot])
+
+    def _parallelForward(self, forwardOps):
+        from simplegrad.architecture.Parallel import runParallel
+
+        values = self._values
+        dirty = self._dirty
+        ops = []
+        for op in forwardOps:
+            kernel, out, inputs = op
+            dirty[out] = any([dirty[i] for i in inputs])
+            if dirty[out]:
+                ops.append(op)
+        producers = {out: i for i, (kernel, out, inputs) in enumerate(ops)}
+        waits = [set([producers[i] for i in inputs if i in producers]) for kernel, out, inputs in ops]
+
+        def run(i):
+            kernel, out, inputs = ops[i]
+            return kernel(*[values[j] for j in inputs])
+
+        def done(i, value):
+            values[ops[i][1]] = value
+
+        runParallel(self._executor, waits, run, done, serial=set([i for i, op in enumerate(ops) if op[1] in self._serial]))
+
+    def _parallelBackward(self, ops):
+        """
+        Kernels run on the pool, their results are accumulated into gradients
+        by the calling thread, so shared children are never written concurrently.
+        A node waits for every node writing into its gradient
+        """
+        from simplegrad.architecture.Parallel import runParallel
+
+        values = self._values
+        grads = self._grads
+        writers = {}
+        for i, (kernel, out, inputs, edges) in enumerate(ops):
+            for edge in edges:
+                if edge is not None:
+                    writers.setdefault(edge[0], set()).add(i)
+        waits = [writers.get(out, set()) for kernel, out, inputs, edges in ops]
+        # Order of writers differs from the sequential one, the first
+        # to finish overwrites gradient of an interior node
+        written = set()
+
+        def run(i):
+            kernel, out, inputs, edges = ops[i]
+            return kernel(grads[out], values[out], *[values[j] for j in inputs])
+
+        def done(i, childGrads):
+            for edge, childGrad in zip(ops[i][3], childGrads):
+                if edge is None:
+                    continue
+                slot = edge[0]
+                self._accumulate(slot, childGrad, slot in self._interior and slot not in written)
+                written.add(slot)
+
+        runParallel(self._executor, waits, run, done, serial=set([i for i, op in enumerate(ops) if op[1] in self._serial]))
+
+    def zeroGrad(self):
+        for node, slot in self._leaves:
+            self._grads[slot].fill(0)
+            if self._writeback:
+                node._grad = self._grads[slot]
+        self._zeroed = True
+
+    def calcGrad(self):
+        self.forward()
+        self.backward()
+
+    def value(self, node) -> np.ndarray:
+        """
+        :return: forward value of node, None if it was fused into a chain
+                 or released by checkpointing
+        """
+        if node.id not in self._slots:
+            return None
+        return self._values[self._slots[node.id]]
+
+    def grad(self, node) -> np.ndarray:
+        """
+        :return: gradient of node, None if it was fused into a chain
+                 or, for interior nodes, released by checkpointing
+        """
+        if node.id not in self._slots:
+            return None
+        return self._grads[self._slots[node.id]]
+
+    @property
+    def scalar(self):
+        return self._root.scalar
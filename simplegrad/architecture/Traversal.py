@@ -0,0 +1,56 @@
+def postOrder(root, children=lambda node: node._children) -> list:
+    """
+    Iterative depth-first traversal of the graph below root.
+    Every node is listed once, after all of its children,
+    so the result is a topological order of the DAG
+
+    :param children: children of a node that are visited
+    """
+    order = []
+    visited = {root.id}
+    stack = [(root, iter(children(root)))]
+    while stack:
+        node, nodeChildren = stack[-1]
+        for child in nodeChildren:
+            if child.id not in visited:
+                visited.add(child.id)
+                stack.append((child, iter(children(child))))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+    return order
+
+
+class ExecutionPlan:
+    """
+    Topological order of a graph, shared by all graph walks.
+    Built for the structure version it was created at and rebuilt
+    by GraphBase once the structure changes
+    """
+
+    def __init__(self, root, version: int):
+        self.version = version
+        self.nodes = postOrder(root)
+        for node in self.nodes:
+            if node._children:
+                node._checkRequiresGrad()
+        self.gradNodes = [node for node in self.nodes if node._requires_grad]
+        # Leaves that may be fed values of another shape (e.g. batch size),
+        # shapes of the graph are inferred on the first refresh
+        self.inputs = [(node, None) for node in self.nodes if node._reshapeable]
+        self.shapeVersion = 0
+
+    def refreshShapes(self) -> bool:
+        """
+        Re-infers node shapes if any input changed its shape since the last call
+        :return: True if shapes were re-inferred
+        """
+        if all([node.shape == shape for node, shape in self.inputs]):
+            return False
+        for node in self.nodes:
+            if node._children:
+                node._shape = node._inferShape()
+        self.inputs = [(node, node.shape) for node, shape in self.inputs]
+        self.shapeVersion += 1
+        return True
@@ -0,0 +1,73 @@
+import os
+import struct
+
+import numpy as np
+
+_MAGIC = b"SGWEIGHT"
+_VERSION = 1
+# Arrays start at multiples of cache line size, so mapped views are aligned for any dtype
+_ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def writeWeights(path, header: dict, arrays: list):
+    """
+    Writes arrays after a JSON header: magic, header length as uint64,
+    header with dtype, shape and offset of every array, then raw arrays
+    in C order, each aligned to 64 bytes
+
+    :param path: file path
+    :param header: JSON serializable description stored with the arrays
+    :param arrays: numpy arrays
+    """
+    import json
+
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+    entries = []
+    offset = 0
+    for array in arrays:
+        entries.append({"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        offset = _align(offset + array.nbytes)
+    text = json.dumps(dict(header, version=_VERSION, arrays=entries)).encode()
+    start = _align(len(_MAGIC) + 8 + len(text))
+    with open(path, "wb") as file:
+        file.write(_MAGIC)
+        file.write(struct.pack("<Q", len(text)))
+        file.write(text)
+        for array, entry in zip(arrays, entries):
+            file.seek(start + entry["offset"])
+            array.tofile(file)
+        file.truncate(start + offset)
+
+
+def readWeights(path) -> tuple[dict, list]:
+    """
+    Reads a file of writeWeights. Arrays are read-only views of one
+    memory mapping of the file, so only the header is read here and
+    processes loading the same file share its pages
+
+    :return: header and arrays
+    """
+    import json
+
+    with open(path, "rb") as file:
+        assert file.read(len(_MAGIC)) == _MAGIC, f"{path} is not a weights file"
+        length, = struct.unpack("<Q", file.read(8))
+        header = json.loads(file.read(length))
+    assert header.pop("version") <= _VERSION, f"{path} was written by a newer version"
+    start = _align(len(_MAGIC) + 8 + length)
+    data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) > start else None
+    arrays = []
+    for entry in header.pop("arrays"):
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        if nbytes == 0:
+            arrays.append(np.empty(shape, dtype=dtype))
+            continue
+        offset = start + entry["offset"]
+        arrays.append(data[offset:offset + nbytes].view(dtype).reshape(shape))
+    return header, arrays
@@ -1,3 +1,4 @@
 from .primitives.Variable import Variable
 from .primitives.Value import Value
+from .primitives.Placeholder import Placeholder
 from .extensions import Graph
@@ -7,6 +7,11 @@ import operator
 
 
 class Graph(GraphBase, metaclass=ABCMeta):
+    __slots__ = ()
+
+    # Operands of elementwise binary nodes, children or Python scalars
+    _operands = None
+
     def __add__(self, other) -> Graph:
         from simplegrad.implementation.operations.AddNode import AddNode
         other = self._createFromConstant(other, shape=self._shape)
@@ -35,15 +40,23 @@ class Graph(GraphBase, metaclass=ABCMeta):
             return grad.T
 
         def diff(input, by):
-            return input.T.gradientGraph(by=by)
+            return input.gradientGraph(by=by).T
 
         return LambdaNode(self,
                           lambda x: x.T,
                           back,
                           differentiate=diff,
-                        name="Transpose")
-
-    def sum(self, axis=None) -> Graph:
+                        name="Transpose",
+                        tangent=lambda tangent, frwd, input: tangent.T)
+
+    def sum(self, axis=None, chunk_size=None) -> Graph:
+        """
+        :param chunk_size: evaluate row-wise expression over blocks of chunk_size
+                           rows of its placeholders, see ChunkedSumNode
+        """
+        if chunk_size is not None:
+            from simplegrad.implementation.operations.ChunkedSumNode import ChunkedSumNode
+            return ChunkedSumNode(self, chunk_size, axis=axis)
         from simplegrad.implementation.operations.LambdaNode import LambdaNode
 
         def back(grad, frwd, input):
@@ -56,7 +69,8 @@ class Graph(GraphBase, metaclass=ABCMeta):
                           lambda x: np.sum(x, axis=axis, keepdims=True),
                           back,
                           differentiate=diff,
-                        name="Sum")
+                        name="Sum",
+                        tangent=lambda tangent, frwd, input: np.sum(tangent, axis=axis, keepdims=True))
 
     def exp(self) -> Graph:
         from simplegrad.implementation.operations.LambdaNode import LambdaNode
@@ -71,7 +85,9 @@ class Graph(GraphBase, metaclass=ABCMeta):
                           lambda x: np.exp(x),
                           back,
                           differentiate=diff,
-                        name="Expon")
+                        name="Expon",
+                        elementwise=True,
+                        ufunc=np.exp)
 
     def expSubMax(self, axis=-1) -> Graph:
         from simplegrad.implementation.operations.LambdaNode import LambdaNode
@@ -82,11 +98,16 @@ class Graph(GraphBase, metaclass=ABCMeta):
         def diff(input, by):
             return input.expSubMax(axis=axis) * input.gradientGraph(by=by)
 
+        def tangent(tangent, frwd, input):
+            maximum = np.argmax(input, axis=axis, keepdims=True)
+            return frwd * (tangent - np.take_along_axis(tangent, maximum, axis=axis))
+
         return LambdaNode(self,
                           lambda x: np.exp(x - np.max(x, axis=axis, keepdims=True)),
                           back,
                           differentiate=diff,
-                        name="ExponSubMaximum")
+                        name="ExponSubMaximum",
+                        tangent=tangent)
 
     def ln(self) -> Graph:
         from simplegrad.implementation.operations.LambdaNode import LambdaNode
@@ -95,13 +116,15 @@ class Graph(GraphBase, metaclass=ABCMeta):
             return grad / input
 
         def diff(input, by):
-            return input.gradientGraph(by=by) / input.exp()
+            return input.gradientGraph(by=by) / input
 
         return LambdaNode(self,
                           lambda x: np.log(x),
                           back,
                           differentiate=diff,
-                        name="Ln")
+                        name="Ln",
+                        elementwise=True,
+                        ufunc=np.log)
 
     def abs(self) -> Graph:
         from simplegrad.implementation.operations.LambdaNode import LambdaNode
@@ -116,13 +139,41 @@ class Graph(GraphBase, metaclass=ABCMeta):
                           lambda x: np.abs(x),
                           back,
                           differentiate=diff,
-                        name="Abs")
+                        name="Abs",
+                        elementwise=True,
+                        ufunc=np.abs)
 
     def relu(self) -> Graph:
-        return (self > 0) * self
+        from simplegrad.implementation.operations.LambdaNode import LambdaNode
+
+        def back(grad, frwd, input):
+            return grad * (input > 0)
+
+        def diff(input, by):
+            return input.gradientGraph(by=by) * (input > 0)
+
+        return LambdaNode(self,
+                          lambda x: np.maximum(x, 0),
+                          back,
+                          differentiate=diff,
+                          name="Relu",
+                          elementwise=True)
 
     def elu(self, alpha=1.0) -> Graph:
-        return (self > 0) * self + (self <= 0) * alpha * (self.exp() - 1)
+        from simplegrad.implementation.operations.LambdaNode import LambdaNode
+
+        def back(grad, frwd, input):
+            return grad * np.where(input > 0, 1, frwd + alpha)
+
+        def diff(input, by):
+            return input.gradientGraph(by=by) * ((input > 0) + (input <= 0) * (input.elu(alpha) + alpha))
+
+        return LambdaNode(self,
+                          lambda x: np.where(x > 0, x, alpha * np.expm1(np.minimum(x, 0))),
+                          back,
+                          differentiate=diff,
+                          name="Elu",
+                          elementwise=True)
 
     def sigmoid(self) -> Graph:
         from simplegrad.implementation.operations.LambdaNode import LambdaNode
@@ -141,52 +192,181 @@ class Graph(GraphBase, metaclass=ABCMeta):
                           safeSigmoid,
                           back,
                           differentiate=diff,
-                          name="Sigmoid")
+                          name="Sigmoid",
+                          elementwise=True)
 
     def tanh(self) -> Graph:
-        x = self
-        xNeg = self * -1
-        return (x.exp() - xNeg.exp()) / (x.exp() + xNeg.exp())
+        from simplegrad.implementation.operations.LambdaNode import LambdaNode
+
+        def back(grad, frwd, input):
+            return grad * (1 - frwd * frwd)
+
+        def diff(input, by):
+            return input.gradientGraph(by=by) * (1 - input.tanh() ** 2)
+
+        return LambdaNode(self,
+                          lambda x: np.tanh(x),
+                          back,
+                          differentiate=diff,
+                          name="Tanh",
+                          elementwise=True,
+                          ufunc=np.tanh)
 
     def sign(self) -> Graph:
         return ((self > 0) * 2 - 1) * (self != 0)
 
     def softmax(self, axis=-1) -> Graph:
-        return self.expSubMax(axis=axis) /\
-               (self.expSubMax(axis=axis).sum(axis=axis))
+        from simplegrad.implementation.operations.LambdaNode import LambdaNode
+
+        def softmax(x):
+            exp = np.exp(x - np.max(x, axis=axis, keepdims=True))
+            return exp / np.sum(exp, axis=axis, keepdims=True)
+
+        def back(grad, frwd, input):
+            return frwd * (grad - np.sum(grad * frwd, axis=axis, keepdims=True))
+
+        def diff(input, by):
+            probs = input.softmax(axis=axis)
+            inputGrad = input.gradientGraph(by=by)
+            return probs * (inputGrad - (probs * inputGrad).sum(axis=axis))
 
+        # Jacobian of softmax is symmetric, backward rule applies to tangents as well
+        node = LambdaNode(self,
+                          softmax,
+                          back,
+                          differentiate=diff,
+                          name="Softmax",
+                          tangent=back)
+        # Used by crossentropy() to start from the logits
+        node._axis = axis
+        return node
+
+    def log_softmax(self, axis=-1) -> Graph:
+        from simplegrad.implementation.operations.LambdaNode import LambdaNode
+
+        def logSoftmax(x):
+            shifted = x - np.max(x, axis=axis, keepdims=True)
+            return shifted - np.log(np.sum(np.exp(shifted), axis=axis, keepdims=True))
+
+        def back(grad, frwd, input):
+            return grad - np.exp(frwd) * np.sum(grad, axis=axis, keepdims=True)
+
+        def diff(input, by):
+            inputGrad = input.gradientGraph(by=by)
+            return inputGrad - (input.softmax(axis=axis) * inputGrad).sum(axis=axis)
+
+        def tangent(tangent, frwd, input):
+            return tangent - np.sum(np.exp(frwd) * tangent, axis=axis, keepdims=True)
+
+        return LambdaNode(self,
+                          logSoftmax,
+                          back,
+                          differentiate=diff,
+                          name="LogSoftmax",
+                          tangent=tangent)
+
+    def crossentropy(self, labels, axis=-1) -> Graph:
+        """
+        Cross-entropy of predicted probabilities against labels, summed over rows.
+        Softmax output is not evaluated: loss is computed from its logits
+        by a single CrossEntropyNode
+        """
+        from simplegrad.implementation.operations.LambdaNode import LambdaNode
+        from simplegrad.implementation.primitives.Value import Value
+        if not isinstance(labels, GraphBase):
+            labels = Value(labels)
+        if isinstance(self, LambdaNode) and self._name == "Softmax" and self._axis == axis:
+            from simplegrad.implementation.operations.CrossEntropyNode import CrossEntropyNode
+            return CrossEntropyNode(self._children[0], labels, axis=axis)
+        return (-1 * (self + 1e-8).ln() * labels).sum()
+
+
+    def _setOperands(self, left, right):
+        """
+        Sets operands of elementwise binary node. Graph operands become children,
+        Python scalars are kept as constants of the node. Kernels rely on NumPy
+        broadcasting, backward reduces gradients to operand shapes
+        """
+        self._operands = (left, right)
+        self._children = [operand for operand in self._operands if isinstance(operand, GraphBase)]
+        self._shape = self._inferOperandsShape()
+
+    def _inferOperandsShape(self) -> tuple:
+        shapes = [operand.shape for operand in self._children]
+        if len(shapes) == 1 or shapes[0] == shapes[1]:
+            return shapes[0]
+        return np.broadcast_shapes(*shapes)
+
+    def _operandValues(self, inputs) -> tuple:
+        """
+        Kernel arguments: forward values of children with scalar operands in their places
+        """
+        if self._operands is None:
+            return inputs
+        inputs = iter(inputs)
+        return tuple(next(inputs) if isinstance(operand, GraphBase) else operand for operand in self._operands)
+
+    def _operandGrads(self, *gradients) -> tuple:
+        """
+        :param gradients: function computing gradient of every operand,
+                          called only for children that require gradient
+        :return: gradient of every child reduced to its shape
+        """
+        grads = []
+        for operand, gradient in zip(self._operands, gradients):
+            if not isinstance(operand, GraphBase):
+                continue
+            if not operand._requires_grad:
+                grads.append(None)
+                continue
+            grad = gradient()
+            if grad.shape != operand.shape:
+                axes = tuple(i for i, size in enumerate(operand.shape) if size == 1 and grad.shape[i] != 1)
+                grad = np.sum(grad, axis=axes, keepdims=True)
+            grads.append(grad)
+        return tuple(grads)
+
+    def _operandTangent(self, tangents, *terms):
+        """
+        :param tangents: tangent of every child, None if it is zero
+        :param terms: function of operand tangent giving its term of the node tangent
+        :return: sum of terms of operands with nonzero tangent in output shape
+        """
+        tangents = iter(tangents)
+        result = None
+        for operand, term in zip(self._operands, terms):
+            if not isinstance(operand, GraphBase):
+                continue
+            tangent = next(tangents)
+            if tangent is None:
+                continue
+            value = term(tangent)
+            result = value if result is None else result + value
+        if result is not None and result.shape != self.shape:
+            result = np.broadcast_to(result, self.shape)
+        return result
+
+    def _operandsKey(self) -> tuple:
+        return tuple(None if isinstance(operand, GraphBase) else operand for operand in self._operands)
 
     def _createFromConstant(self, constant, shape) -> Graph:
         from simplegrad.implementation.primitives.Value import Value
-        if isinstance(constant, (int, float, np.ndarray)):
+        if isinstance(constant, (int, float, np.number)):
+            # Kept as Python float so it does not change dtype of the result
+            return float(constant)
+        if isinstance(constant, np.ndarray):
             return Value(constant)
         return constant
 
     def broadcast_to(self, shape):
         if self.shape == shape:
             return self
-        from simplegrad.implementation.operations.LambdaNode import LambdaNode
+        from simplegrad.implementation.operations.BroadcastNode import BroadcastNode
 
         if shape != np.broadcast_shapes(self.shape, shape):
             raise ValueError(f"Cannot broadcast {self.shape} to {shape}")
 
-        def back(grad, frwd, input):
-            broadcasting = []
-            for i, ax in enumerate(self.shape):
-                if ax == 1:
-                    broadcasting.append(i)
-            return np.sum(grad, axis=tuple(broadcasting), keepdims=True)
-
-        def diff(input, by):
-            return input.gradientGraph(by)
-
-        return LambdaNode(
-            self,
-            lambda x: np.broadcast_to(x, shape=shape),
-            back,
-            differentiate=diff,
-                        name="Broadcast"
-        )
+        return BroadcastNode(self, shape)
 
     def _tryBroadcast(self, shape) -> Graph | None:
         try:
@@ -253,6 +433,38 @@ class Graph(GraphBase, metaclass=ABCMeta):
     def __rmatmul__(self, other) -> Graph:
         return other @ self
 
-    @abstractmethod
-    def gradientGraph(self, by):
-        pass
+    @staticmethod
+    def _derivativeSum(left: Graph, right: Graph) -> Graph:
+        """
+        Sum of derivative terms, zero terms are skipped
+        """
+        if GraphBase._naiveDerivatives is None:
+            shape = np.broadcast_shapes(left.shape, right.shape)
+            if left._constant == 0:
+                return right.broadcast_to(shape)
+            if right._constant == 0:
+                return left.broadcast_to(shape)
+        return left + right
+
+    @staticmethod
+    def _derivativeProduct(left, right) -> Graph:
+        """
+        Product of derivative terms (graphs or scalars), zeros and ones are propagated
+        """
+        if GraphBase._naiveDerivatives is None:
+            shape = np.broadcast_shapes(*[operand.shape for operand in (left, right) if isinstance(operand, GraphBase)])
+            leftConstant = left._constant if isinstance(left, GraphBase) else left
+            rightConstant = right._constant if isinstance(right, GraphBase) else right
+            if leftConstant == 0 or rightConstant == 0:
+                return GraphBase._constantGraph(shape, 0.0)
+            if leftConstant == 1 and isinstance(right, GraphBase):
+                return right.broadcast_to(shape)
+            if rightConstant == 1 and isinstance(left, GraphBase):
+                return left.broadcast_to(shape)
+        return left * right
+
+    @staticmethod
+    def _derivativeMatmul(left: Graph, right: Graph) -> Graph:
+        if GraphBase._naiveDerivatives is None and (left._constant == 0 or right._constant == 0):
+            return GraphBase._constantGraph((left.shape[0], right.shape[1]), 0.0)
+        return left @ right
@@ -3,49 +3,41 @@ import numpy as np
 
 
 class AddNode(Graph):
-    def __init__(self, left: Graph, right: Graph):
+    __slots__ = ("_operands",)
+    _elementwise = True
+    _ufunc = np.add
+
+    def __init__(self, left: Graph, right: Graph | float):
         super().__init__()
 
-        shape = np.broadcast_shapes(left.shape, right.shape)
+        self._setOperands(left, right)
+        self._checkRequiresGrad()
 
-        left = left._graphCopy().broadcast_to(shape)
-        right = right._graphCopy().broadcast_to(shape)
+    def _inferShape(self) -> tuple:
+        return self._inferOperandsShape()
 
-        self._children = [left, right]
-        self._shape = shape
-        self._checkRequiresGrad()
+    def _cseKey(self):
+        return self._operandsKey()
+
+    def _forwardKernel(self, *inputs):
+        left, right = self._operandValues(inputs)
+        return left + right
+
+    def _backwardKernel(self, grad, frwd, *inputs):
+        return self._operandGrads(lambda: grad, lambda: grad)
+
+    def _tangentKernel(self, tangents, frwd, *inputs):
+        return self._operandTangent(tangents, lambda tangent: tangent, lambda tangent: tangent)
 
-    def forward(self) -> np.ndarray:
-        if not self._prevFrwd is None:
-            return self._frwd
-        self._children[0].forward()
-        self._children[1].forward()
-        self._frwd = self._children[0]._frwd + self._children[1]._frwd
-        return self._frwd
-
-    def _backward(self):
-        self._buildGrad()
-        if not self._requires_grad:
-            return
-
-        assert self._children[0].grad.shape == self.grad.shape, f"Gradient shapes mismatch: " \
-                                                                  f"{self._children[0]._grad.shape}, {self._grad.shape}"
-        assert self._children[1].grad.shape == self.grad.shape, f"Gradient shapes mismatch: " \
-                                                                  f"{self._children[1]._grad.shape}, {self._grad.shape}"
-
-        self._children[0]._grad += self.grad
-        self._children[1]._grad += self.grad
-
-    def gradientGraph(self, by):
-        if by._id not in self._variables_set:
-            from simplegrad.implementation.primitives.Value import Value
-            return Value(np.zeros(self.shape))
-        return AddNode(self._children[0].gradientGraph(by),
-                       self._children[1].gradientGraph(by))
+    def _gradientGraph(self, by):
+        grads = [child.gradientGraph(by) for child in self._children]
+        if len(grads) == 1:
+            return grads[0].broadcast_to(self.shape)
+        return self._derivativeSum(grads[0], grads[1])
 
     def __copy__(self):
         from copy import deepcopy
-        return deepcopy(self._children[0]) + deepcopy(self._children[1])
+        return AddNode(deepcopy(self._operands[0]), deepcopy(self._operands[1]))
 
     def _graphCopy(self):
-        return self._children[0] + self._children[1]
+        return AddNode(self._operands[0], self._operands[1])
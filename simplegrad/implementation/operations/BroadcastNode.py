@@ -0,0 +1,45 @@
+from simplegrad.implementation.extensions.Graph_operations import Graph
+import numpy as np
+
+
+class BroadcastNode(Graph):
+    __slots__ = ()
+
+    def __init__(self, value: Graph, shape: tuple):
+        """
+        Broadcasts value to shape, created by broadcast_to().
+        Binary nodes broadcast their operands without it
+        """
+        super().__init__()
+        self._children = [value]
+        self._shape = shape
+        self._checkRequiresGrad()
+
+    def _forwardKernel(self, input):
+        return np.broadcast_to(input, self._shape)
+
+    def _cseKey(self):
+        return self._shape
+
+    def _backwardKernel(self, grad, frwd, input):
+        broadcasting = tuple(i for i, ax in enumerate(input.shape) if ax == 1)
+        return np.sum(grad, axis=broadcasting, keepdims=True),
+
+    def _tangentKernel(self, tangents, frwd, input):
+        return np.broadcast_to(tangents[0], self._shape)
+
+    def _gradientGraph(self, by):
+        return self._children[0].gradientGraph(by).broadcast_to(self.shape)
+
+    def __copy__(self):
+        from copy import deepcopy
+        return deepcopy(self._children[0]).broadcast_to(self.shape)
+
+    def _graphCopy(self):
+        return self._children[0].broadcast_to(self.shape)
+
+    def _dot_description(self, show_grad_values):
+        values = ""
+        if show_grad_values:
+            values += "\n" + self._gradString()
+        return "Broadcast" + f"\n{self.shape}" + values
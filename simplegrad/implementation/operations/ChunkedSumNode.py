@@ -0,0 +1,106 @@
+from simplegrad.architecture.Tape import CompiledGraph
+from simplegrad.architecture.Traversal import postOrder
+from simplegrad.implementation.extensions.Graph_operations import Graph
+import numpy as np
+
+
+class ChunkedSumNode(Graph):
+    __slots__ = ("_inputs", "_variables", "_value", "_chunk_size", "_axis", "_inner")
+
+    # Blocks are exposed by windowing shared placeholders
+    _threadSafe = False
+
+    def __init__(self, value: Graph, chunk_size: int, axis=None):
+        """
+        Sum over rows of a row-wise expression, evaluated block by block:
+        placeholders of the expression expose chunk_size rows at a time,
+        so intermediate arrays never hold the whole dataset.
+        Backward recomputes forward of every block.
+
+        :param value: row-wise expression of placeholders and variables
+        :param chunk_size: number of rows in a block
+        :param axis: None or 0, result is reduced over rows
+        """
+        super().__init__()
+        assert axis in (None, 0), "Chunked sum must reduce over rows"
+        nodes = postOrder(value)
+        self._inputs = [node for node in nodes if node._reshapeable]
+        assert len(self._inputs) > 0, "Chunked sum needs Placeholder inputs"
+        self._variables = [node for node in nodes if node._mutable and not node._reshapeable]
+
+        self._children = self._variables + self._inputs
+        self._value = value
+        self._chunk_size = chunk_size
+        self._axis = axis
+        self._inner = None
+        self._shape = self._inferShape()
+        self._checkRequiresGrad()
+
+    def _inferShape(self) -> tuple:
+        if self._axis is None:
+            return 1, 1
+        return 1, self._value.shape[1]
+
+    def _innerTape(self) -> CompiledGraph:
+        plan = self._value._executionPlan()
+        if self._inner is None or self._inner.plan is not plan:
+            self._inner = CompiledGraph(self._value, plan, writeback=False)
+        return self._inner
+
+    def _blocks(self):
+        rows = self._inputs[0].rows
+        assert all([input.rows == rows for input in self._inputs]), "Chunked sum inputs must have equal rows"
+        saved = [(input._value, input._version) for input in self._inputs]
+        try:
+            for start in range(0, rows, self._chunk_size):
+                for input in self._inputs:
+                    input._window(start, start + self._chunk_size)
+                yield
+        finally:
+            # Placeholders expose all rows again once blocks are done, unchanged
+            # for the rest of the graph and tapes reading their versions
+            for input, (value, version) in zip(self._inputs, saved):
+                input._restore(value, version)
+
+    def _forwardKernel(self, *inputs):
+        tape = self._innerTape()
+        total = np.zeros(self._shape, dtype=self._dtype)
+        for _ in self._blocks():
+            total += np.sum(tape.forward(), axis=self._axis, keepdims=True)
+        return total
+
+    def _backwardKernel(self, grad, frwd, *inputs):
+        tape = self._innerTape()
+        tape.zeroGrad()
+        # Leaf gradients accumulate over blocks
+        for _ in self._blocks():
+            tape.forward()
+            tape.backward(ignore_warnings=True, seed=grad)
+        grads = [tape.grad(var) if var._requires_grad else None for var in self._variables]
+        return tuple(grads) + (None,) * len(self._inputs)
+
+    def _tangentKernel(self, tangents, frwd, *inputs):
+        # Tangents of placeholders would have to be windowed with them
+        variables = [var for var, tangent in zip(self._variables, tangents) if tangent is not None]
+        variableTangents = [tangent for tangent in tangents[:len(self._variables)] if tangent is not None]
+        total = np.zeros(self._shape, dtype=self._dtype)
+        for _ in self._blocks():
+            _, tangent = self._value.jvp(variables, variableTangents)
+            total += np.sum(tangent, axis=self._axis, keepdims=True)
+        return total
+
+    def _gradientGraph(self, by):
+        return self._value.gradientGraph(by).sum(axis=self._axis)
+
+    def __copy__(self):
+        from copy import deepcopy
+        return deepcopy(self._value).sum(axis=self._axis, chunk_size=self._chunk_size)
+
+    def _graphCopy(self):
+        return self._value.sum(axis=self._axis, chunk_size=self._chunk_size)
+
+    def _dot_description(self, show_grad_values):
+        values = ""
+        if show_grad_values:
+            values += "\n" + self._gradString()
+        return f"ChunkedSum\n<{self._chunk_size} rows>\n{self.shape}" + values
@@ -1,51 +1,50 @@
 from copy import deepcopy
 
 from simplegrad.implementation.extensions.Graph_operations import Graph
-from simplegrad.implementation.primitives.Value import Value
 import numpy as np
 import operator
 
 
 class ComparisonNode(Graph):
-    def __init__(self, left: Graph, right: Graph, operator:operator):
-        super().__init__()
-
-        shape = np.broadcast_shapes(left.shape, right.shape)
+    __slots__ = ("_operands", "_operator")
+    _differentiable = False
 
-        left = left._graphCopy().broadcast_to(shape)
-        right = right._graphCopy().broadcast_to(shape)
+    def __init__(self, left: Graph, right: Graph | float, operator:operator):
+        super().__init__()
 
-        self._children = [left, right]
-        self._shape = shape
+        self._setOperands(left, right)
         self._operator = operator
         self._checkRequiresGrad()
 
-    def forward(self) -> np.ndarray:
-        if not self._prevFrwd is None:
-            return self._frwd
-        self._frwd = self._operator(
-            self._children[0].forward(),
-            self._children[1].forward()
-        )
-        return self._frwd
+    def _inferShape(self) -> tuple:
+        return self._inferOperandsShape()
+
+    def _forwardKernel(self, *inputs):
+        left, right = self._operandValues(inputs)
+        return self._operator(left, right)
+
+    def _backwardKernel(self, grad, frwd, *inputs):
+        return (None,) * len(inputs)
+
+    def _tangentKernel(self, tangents, frwd, *inputs):
+        return None
 
-    def _backward(self):
-        self._buildGrad()
-        pass
+    def _cseKey(self):
+        return self._operator, self._operandsKey()
 
-    def gradientGraph(self, by):
-        return Value(np.zeros(self.shape))
+    def _gradientGraph(self, by):
+        return self._constantGraph(self.shape, 0.0)
 
     def __copy__(self):
         return ComparisonNode(
-            deepcopy(self._children[0]._graphCopy()),
-            deepcopy(self._children[1]._graphCopy()),
+            deepcopy(self._operands[0]),
+            deepcopy(self._operands[1]),
             self._operator
         )
 
     def _graphCopy(self):
         return ComparisonNode(
-            self._children[0]._graphCopy(),
-            self._children[1]._graphCopy(),
+            self._operands[0],
+            self._operands[1],
             self._operator
         )
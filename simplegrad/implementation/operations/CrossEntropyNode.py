@@ -0,0 +1,72 @@
+from simplegrad.implementation.extensions.Graph_operations import Graph
+import numpy as np
+
+
+class CrossEntropyNode(Graph):
+    __slots__ = ("_axis",)
+
+    def __init__(self, logits: Graph, labels: Graph, axis=-1):
+        """
+        Cross-entropy of softmax(logits) against labels, summed over rows.
+        Evaluated through log-softmax, backward is softmax(logits) - labels
+        scaled by label mass
+
+        :param logits: unnormalized scores
+        :param labels: target probabilities of the same shape
+        :param axis: softmax axis
+        """
+        super().__init__()
+        assert logits.shape == labels.shape, f"Labels shape {labels.shape} does not match logits {logits.shape}"
+        self._children = [logits, labels]
+        self._axis = axis
+        self._shape = (1, 1)
+        self._checkRequiresGrad()
+
+    def _cseKey(self):
+        return self._axis
+
+    def _logSoftmax(self, logits):
+        shifted = logits - np.max(logits, axis=self._axis, keepdims=True)
+        return shifted - np.log(np.sum(np.exp(shifted), axis=self._axis, keepdims=True))
+
+    def _forwardKernel(self, logits, labels):
+        return -np.sum(labels * self._logSoftmax(logits), keepdims=True)
+
+    def _backwardKernel(self, grad, frwd, logits, labels):
+        logProbs = self._logSoftmax(logits)
+        logitsGrad = grad * (np.exp(logProbs) * np.sum(labels, axis=self._axis, keepdims=True) - labels)
+        labelsGrad = None
+        if self._children[1]._requires_grad:
+            labelsGrad = -grad * logProbs
+        return logitsGrad, labelsGrad
+
+    def _tangentKernel(self, tangents, frwd, logits, labels):
+        logitsTangent, labelsTangent = tangents
+        logProbs = self._logSoftmax(logits)
+        result = np.zeros(self._shape, dtype=frwd.dtype)
+        if logitsTangent is not None:
+            logProbsTangent = logitsTangent - np.sum(np.exp(logProbs) * logitsTangent, axis=self._axis, keepdims=True)
+            result -= np.sum(labels * logProbsTangent, keepdims=True)
+        if labelsTangent is not None:
+            result -= np.sum(labelsTangent * logProbs, keepdims=True)
+        return result
+
+    def _composite(self):
+        logits, labels = self._children
+        return (-1 * logits.log_softmax(axis=self._axis) * labels).sum()
+
+    def _gradientGraph(self, by):
+        return self._composite().gradientGraph(by=by)
+
+    def __copy__(self):
+        from copy import deepcopy
+        return CrossEntropyNode(deepcopy(self._children[0]), deepcopy(self._children[1]), axis=self._axis)
+
+    def _graphCopy(self):
+        return CrossEntropyNode(self._children[0], self._children[1], axis=self._axis)
+
+    def _dot_description(self, show_grad_values):
+        values = ""
+        if show_grad_values:
+            values += "\n" + self._gradString()
+        return "CrossEntropy" + f"\n{self.shape}" + values
@@ -0,0 +1,104 @@
+from simplegrad.implementation.extensions.Graph_operations import Graph
+import numpy as np
+
+
+class FusedNode(Graph):
+    __slots__ = ("_members", "_output", "_steps", "_needsGrad", "_buffers", "_values")
+
+    def __init__(self, members: list, children=lambda node: node._children):
+        """
+        Chain of elementwise nodes evaluated as one node of the compiled tape.
+        Members are in topological order, the last one is the chain output
+        and the only member used outside of the chain. Intermediate values
+        are written into buffers reused by every forward, backward runs
+        member kernels in reverse order
+
+        :param members: elementwise nodes of the chain
+        :param children: children of a member (see Rewrite)
+        """
+        output = members[-1]
+        super().__init__(id=output.id)
+        self._members = members
+        self._output = output
+
+        # Local slots: chain inputs first, then members
+        slots = {}
+        self._children = []
+        memberIds = set([member.id for member in members])
+        for member in members:
+            for child in children(member):
+                if child.id not in slots and child.id not in memberIds:
+                    slots[child.id] = len(self._children)
+                    self._children.append(child)
+        for i, member in enumerate(members):
+            slots[member.id] = len(self._children) + i
+        self._steps = [(member, tuple(slots[child.id] for child in children(member))) for member in members]
+        # Gradients are kept only for slots that propagate them further
+        self._needsGrad = [node._requires_grad for node in self._children + members]
+        self._buffers = [None] * len(members)
+        self._values = None
+
+        self._dtype = output._dtype
+        self._requires_grad = output._requires_grad
+        self._variables_mask = output._variables_mask
+        self._batched = output._batched
+
+    @property
+    def shape(self):
+        return self._output.shape
+
+    def _buffer(self, i) -> np.ndarray:
+        member = self._members[i]
+        buffer = self._buffers[i]
+        if buffer is None or buffer.shape != member.shape:
+            buffer = np.empty(member.shape, dtype=member._dtype)
+            self._buffers[i] = buffer
+        return buffer
+
+    def _forwardKernel(self, *inputs):
+        values = list(inputs)
+        last = len(self._steps) - 1
+        for i, (member, slots) in enumerate(self._steps):
+            args = [values[slot] for slot in slots]
+            # Output is returned to the tape, it must not be overwritten later
+            if member._ufunc is not None and i != last:
+                values.append(member._ufunc(*member._operandValues(args), out=self._buffer(i)))
+            else:
+                values.append(member._forwardKernel(*args))
+        self._values = values
+        return values[-1]
+
+    def _backwardKernel(self, grad, frwd, *inputs):
+        values = self._values
+        grads = [None] * len(values)
+        grads[-1] = grad
+        count = len(inputs)
+        for i in reversed(range(len(self._steps))):
+            member, slots = self._steps[i]
+            memberGrad = grads[count + i]
+            # Released once consumed, so at most a few full-size gradients are alive
+            grads[count + i] = None
+            if memberGrad is None or not member._requires_grad:
+                continue
+            childGrads = member._backwardKernel(memberGrad, values[count + i], *[values[slot] for slot in slots])
+            for slot, childGrad in zip(slots, childGrads):
+                if childGrad is None or not self._needsGrad[slot]:
+                    continue
+                if grads[slot] is None:
+                    grads[slot] = childGrad
+                else:
+                    grads[slot] = grads[slot] + childGrad
+        return tuple(grads[:count])
+
+    def _gradientGraph(self, by):
+        return self._output.gradientGraph(by)
+
+    def __copy__(self):
+        return self._output.__copy__()
+
+    def _graphCopy(self):
+        return self._output._graphCopy()
+
+    def _dot_description(self, show_grad_values):
+        names = [member._dot_description(False).split("\n")[0] for member in self._members]
+        return "Fused\n<" + ", ".join(names) + f">\n{self.shape}"
@@ -5,7 +5,11 @@ import numpy as np
 
 
 class LambdaNode(Graph):
-    def __init__(self, value: Graph, forward, backward, differentiate=None, name=None):
+    __slots__ = ("_forwardLambda", "_backwardLambda", "_differentiate", "_name", "_elementwise", "_ufunc",
+                 "_tangentLambda", "_axis", "_probed")
+
+    def __init__(self, value: Graph, forward, backward, differentiate=None, name=None, elementwise=False, ufunc=None,
+                 tangent=None):
         """
 
         :param value: Graph value
@@ -14,34 +18,76 @@ class LambdaNode(Graph):
                          second is node forward value
                          third is node input
                          Must return gradient
+        :param elementwise: forward maps every element independently
+        :param ufunc: NumPy ufunc equal to forward
+        :param tangent: forward-mode rule with arguments as in backward
+                        but input tangent first, backward is used
+                        for elementwise nodes if not given
         """
         super().__init__()
-        value = value._graphCopy()
 
         self._children = [value]
         self._forwardLambda = forward
         self._backwardLambda = backward
-        self._shape = forward(np.ones(value.shape)).shape
+        self._probed = None
+        self._shape = self._inferShape()
         self._differentiate = differentiate
         self._name = name
+        self._elementwise = elementwise
+        self._ufunc = ufunc
+        self._tangentLambda = tangent
+        # Softmax axis, see Graph.softmax()
+        self._axis = None
         self._checkRequiresGrad()
 
-    def forward(self) -> np.ndarray:
-        if not self._prevFrwd is None:
-            return self._frwd
-        self._frwd = self._forwardLambda(self._children[0].forward())
-        return self._frwd
-
-    def _backward(self):
-        self._buildGrad()
-        if not self._requires_grad:
-            return
-        self._children[0]._grad += self._backwardLambda(self._grad, self._frwd, self._children[0].value)
-
-    def gradientGraph(self, by):
-        if by._id not in self._variables_set:
-            from simplegrad.implementation.primitives.Value import Value
-            return Value(np.zeros(self.shape))
+    def _inferShape(self) -> tuple:
+        child = self._children[0]
+        shape = child.shape
+        if not child._batched or shape[0] <= 3:
+            # Zero strides, no input of the whole shape is allocated
+            return self._forwardLambda(np.broadcast_to(np.ones((), dtype=child._dtype), shape)).shape
+        # Inputs of placeholders are probed on two and three rows, output axes
+        # that follow the number of rows get the real one. Checked by the first
+        # forward on the whole input, see _forwardKernel
+        two = self._forwardLambda(np.ones((2,) + shape[1:], dtype=child._dtype)).shape
+        three = self._forwardLambda(np.ones((3,) + shape[1:], dtype=child._dtype)).shape
+        self._probed = shape
+        return tuple(shape[0] if (a, b) == (2, 3) else a for a, b in zip(two, three))
+
+    def _forwardKernel(self, input):
+        output = self._forwardLambda(input)
+        # Blocks of chunked sums have fewer rows than the inferred shape
+        if self._probed is not None and input.shape == self._probed:
+            assert output.shape == self._shape, \
+                f"{self._name or type(self).__name__} returned {output.shape}, rows of its input " \
+                f"gave {self._shape}. Lambdas of Placeholder inputs must keep or reduce their rows"
+            self._probed = None
+        return output
+
+    def _backwardKernel(self, grad, frwd, input):
+        return self._backwardLambda(grad, frwd, input),
+
+    def _tangentKernel(self, tangents, frwd, input):
+        if self._tangentLambda is not None:
+            return self._tangentLambda(tangents[0], frwd, input)
+        assert self._elementwise, "Define tangent for custom LambdaNode"
+        # Jacobian of elementwise function is diagonal, so is its own transpose
+        return self._backwardLambda(tangents[0], frwd, input)
+
+    def _cseKey(self):
+        # Lambdas are recreated by every operator call, they are compared
+        # by code and captured parameters (e.g. axis)
+        code = getattr(self._forwardLambda, "__code__", None)
+        if code is None:
+            return None
+        cells = tuple(cell.cell_contents for cell in self._forwardLambda.__closure__ or ())
+        try:
+            hash(cells)
+        except TypeError:
+            return None
+        return code, cells, getattr(self._backwardLambda, "__code__", None), self._ufunc
+
+    def _gradientGraph(self, by):
         assert not self._differentiate is None, "Define differentiation for custom LambdaNode"
         return self._differentiate(self._children[0], by)
 
@@ -50,7 +96,10 @@ class LambdaNode(Graph):
                           self._forwardLambda,
                           self._backwardLambda,
                           self._differentiate,
-                          name=self._name
+                          name=self._name,
+                          elementwise=self._elementwise,
+                          ufunc=self._ufunc,
+                          tangent=self._tangentLambda
                           )
 
     def _graphCopy(self):
@@ -59,7 +108,10 @@ class LambdaNode(Graph):
             forward=self._forwardLambda,
             backward=self._backwardLambda,
             differentiate=self._differentiate,
-            name=self._name
+            name=self._name,
+            elementwise=self._elementwise,
+            ufunc=self._ufunc,
+            tangent=self._tangentLambda
         )
 
     def _dot_description(self, show_grad_values):
@@ -3,42 +3,45 @@ import numpy as np
 
 
 class MatmulNode(Graph):
+    __slots__ = ()
+
     def __init__(self, left: Graph, right: Graph):
         super().__init__()
 
         assert len(left.shape) == 2, f"Matrix multiplication incorrect shape left: {left.shape}"
         assert len(right.shape) == 2, f"Matrix multiplication incorrect shapes right: {right.shape}"
 
-        left = left._graphCopy()
-        right = right._graphCopy()
-
         self._children = [left, right]
-        self._shape = np.matmul(np.zeros(shape=left.shape),
-                                np.zeros(shape=right.shape)).shape
+        self._shape = self._inferShape()
         self._checkRequiresGrad()
 
-    def forward(self) -> np.ndarray:
-        if not self._prevFrwd is None:
-            return self._frwd
-        self._children[0].forward()
-        self._children[1].forward()
-        self._frwd = np.matmul(self._children[0]._frwd, self._children[1]._frwd)
-        return self._frwd
+    def _inferShape(self) -> tuple:
+        return self._children[0].shape[0], self._children[1].shape[1]
+
+    def _cseKey(self):
+        return ()
+
+    def _forwardKernel(self, left, right):
+        return np.matmul(left, right)
 
     # https://math.stackexchange.com/questions/1866757/not-understanding-derivative-of-a-matrix-matrix-product
-    def _backward(self):
-        self._buildGrad()
-        if not self._requires_grad:
-            return
-        self._children[0]._grad += np.matmul(self._grad, self._children[1]._frwd.T)
-        self._children[1]._grad += np.matmul(self._children[0]._frwd.T, self._grad)
-
-    def gradientGraph(self, by):
-        if by._id not in self._variables_set:
-            from simplegrad.implementation.primitives.Value import Value
-            return Value(np.zeros(self.shape))
-        return self._children[0].gradientGraph(by) @ self._children[1] + \
-               self._children[0] @ self._children[1].gradientGraph(by)
+    def _backwardKernel(self, grad, frwd, left, right):
+        return np.matmul(grad, right.T), np.matmul(left.T, grad)
+
+    def _tangentKernel(self, tangents, frwd, left, right):
+        leftTangent, rightTangent = tangents
+        result = None
+        if leftTangent is not None:
+            result = np.matmul(leftTangent, right)
+        if rightTangent is not None:
+            product = np.matmul(left, rightTangent)
+            result = product if result is None else result + product
+        return result
+
+    def _gradientGraph(self, by):
+        left, right = self._children
+        return self._derivativeSum(self._derivativeMatmul(left.gradientGraph(by), right),
+                                   self._derivativeMatmul(left, right.gradientGraph(by)))
 
     def __copy__(self):
         from copy import deepcopy
@@ -1,51 +1,49 @@
 from simplegrad.implementation.extensions.Graph_operations import Graph
+from simplegrad.architecture.Graph import GraphBase
 import numpy as np
 
 
 class MulNode(Graph):
-    def __init__(self, left: Graph, right: Graph):
+    __slots__ = ("_operands",)
+    _elementwise = True
+    _ufunc = np.multiply
+
+    def __init__(self, left: Graph, right: Graph | float):
         super().__init__()
 
-        shape = np.broadcast_shapes(left.shape, right.shape)
+        self._setOperands(left, right)
+        self._checkRequiresGrad()
 
-        left = left._graphCopy().broadcast_to(shape)
-        right = right._graphCopy().broadcast_to(shape)
+    def _inferShape(self) -> tuple:
+        return self._inferOperandsShape()
 
-        self._children = [left, right]
-        self._shape = shape
-        self._checkRequiresGrad()
+    def _cseKey(self):
+        return self._operandsKey()
+
+    def _forwardKernel(self, *inputs):
+        left, right = self._operandValues(inputs)
+        return left * right
+
+    def _backwardKernel(self, grad, frwd, *inputs):
+        left, right = self._operandValues(inputs)
+        return self._operandGrads(lambda: grad * right, lambda: grad * left)
 
-    def forward(self) -> np.ndarray:
-        if not self._prevFrwd is None:
-            return self._frwd
-        self._children[0].forward()
-        self._children[1].forward()
-        self._frwd = self._children[0]._frwd * self._children[1]._frwd
-        return self._frwd
-
-    def _backward(self):
-        self._buildGrad()
-        if not self._requires_grad:
-            return
-        assert self._children[0].grad.shape == self.grad.shape, f"Gradient shapes mismatch: " \
-                                                                  f"{self._children[0].grad.shape}, {self.grad.shape}"
-        assert self._children[1].grad.shape == self.grad.shape, f"Gradient shapes mismatch: " \
-                                                                  f"{self._children[1].grad.shape}, {self.grad.shape}"
-
-        self._children[0]._grad += self.grad * self._children[1]._frwd
-        self._children[1]._grad += self.grad * self._children[0]._frwd
+    def _tangentKernel(self, tangents, frwd, *inputs):
+        left, right = self._operandValues(inputs)
+        return self._operandTangent(tangents, lambda tangent: tangent * right, lambda tangent: left * tangent)
 
     def __copy__(self):
         from copy import deepcopy
-        return deepcopy(self._children[0]) * deepcopy(self._children[1])
+        return MulNode(deepcopy(self._operands[0]), deepcopy(self._operands[1]))
 
     def _graphCopy(self):
-        return self._children[0] * self._children[1]
-
-    def gradientGraph(self, by):
-        if by._id not in self._variables_set:
-            from simplegrad.implementation.primitives.Value import Value
-            return Value(np.zeros(self.shape))
-        left = self._children[0]
-        right = self._children[1]
-        return left * right.gradientGraph(by=by) + right * left.gradientGraph(by=by)
+        return MulNode(self._operands[0], self._operands[1])
+
+    def _gradientGraph(self, by):
+        left, right = self._operands
+        if not isinstance(right, GraphBase):
+            return self._derivativeProduct(left.gradientGraph(by=by), right)
+        if not isinstance(left, GraphBase):
+            return self._derivativeProduct(right.gradientGraph(by=by), left)
+        return self._derivativeSum(self._derivativeProduct(left, right.gradientGraph(by=by)),
+                                   self._derivativeProduct(right, left.gradientGraph(by=by)))
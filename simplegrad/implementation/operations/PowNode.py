@@ -1,60 +1,58 @@
 from simplegrad.implementation.extensions.Graph_operations import Graph
+from simplegrad.architecture.Graph import GraphBase
 import numpy as np
 
 
 class PowNode(Graph):
-    def __init__(self, left: Graph, right: Graph):
+    __slots__ = ("_operands",)
+    _elementwise = True
+    _ufunc = np.power
+
+    def __init__(self, left: Graph | float, right: Graph | float):
         super().__init__()
 
-        shape = np.broadcast_shapes(left.shape, right.shape)
+        self._setOperands(left, right)
+        self._checkRequiresGrad()
 
-        left = left._graphCopy().broadcast_to(shape)
-        right = right._graphCopy().broadcast_to(shape)
+    def _inferShape(self) -> tuple:
+        return self._inferOperandsShape()
 
-        self._children = [left, right]
-        self._shape = shape
-        self._checkRequiresGrad()
+    def _cseKey(self):
+        return self._operandsKey()
+
+    def _forwardKernel(self, *inputs):
+        left, right = self._operandValues(inputs)
+        return np.power(left, right)
+
+    def _backwardKernel(self, grad, frwd, *inputs):
+        left, right = self._operandValues(inputs)
+        return self._operandGrads(lambda: grad * (right * np.power(left, right - 1)),
+                                  lambda: grad * (frwd * np.log(left)))
 
-    def forward(self) -> np.ndarray:
-        if not self._prevFrwd is None:
-            return self._frwd
-        self._children[0].forward()
-        self._children[1].forward()
-        self._frwd = np.power(self._children[0]._frwd, self._children[1]._frwd)
-        return self._frwd
-
-    def _backward(self):
-        self._buildGrad()
-        if not self._requires_grad:
-            return
-        assert self._children[0].grad.shape == self.grad.shape, f"Gradient shapes mismatch: " \
-                                                                f"{self._children[0].grad.shape}, {self.grad.shape}"
-        assert self._children[1].grad.shape == self.grad.shape, f"Gradient shapes mismatch: " \
-                                                                f"{self._children[1].grad.shape}, {self.grad.shape}"
-
-        self._children[0]._grad += self._grad * (self._children[1]._frwd *
-                                                 np.power(self._children[0]._frwd, self._children[1]._frwd - 1))
-        if self._children[1]._requires_grad:
-            self._children[1]._grad += self._grad * (np.power(self._children[0]._frwd, self._children[1]._frwd) *
-                                                     np.log(self._children[0]._frwd))
+    def _tangentKernel(self, tangents, frwd, *inputs):
+        left, right = self._operandValues(inputs)
+        return self._operandTangent(tangents,
+                                    lambda tangent: tangent * (right * np.power(left, right - 1)),
+                                    lambda tangent: tangent * (frwd * np.log(left)))
 
     def __copy__(self):
-        return PowNode(self._children[0], self._children[1])
+        from copy import deepcopy
+        return PowNode(deepcopy(self._operands[0]), deepcopy(self._operands[1]))
 
     def _graphCopy(self):
-        return self._children[0] ** self._children[1]
-
-    def gradientGraph(self, by):
-        if by._id not in self._variables_set:
-            from simplegrad.implementation.primitives.Value import Value
-            return Value(np.zeros(self.shape))
-        left = self._children[0]
-        right = self._children[1]
-        if by._id not in right._variables_set:
-            return (left ** (right - 1) * right * left.gradientGraph(by=by))
-
-        if by._id not in left._variables_set:
-            return left.ln() * (left ** right) * right.gradientGraph(by=by)
-
-        return (left ** (right - 1) * right * left.gradientGraph(by=by)) +\
-               left.ln() * (left ** right) * right.gradientGraph(by=by)
+        return PowNode(self._operands[0], self._operands[1])
+
+    def _gradientGraph(self, by):
+        left, right = self._operands
+        terms = []
+        if isinstance(left, GraphBase) and left._dependsOn(by):
+            # Square is differentiated into a product, not a power of one
+            power = left if not isinstance(right, GraphBase) and right == 2 else left ** (right - 1)
+            terms.append(self._derivativeProduct(power * right, left.gradientGraph(by=by)))
+        if isinstance(right, GraphBase) and right._dependsOn(by):
+            lnLeft = left.ln() if isinstance(left, GraphBase) else np.log(left)
+            # The power itself is this node
+            terms.append(self._derivativeProduct(self * lnLeft, right.gradientGraph(by=by)))
+        if len(terms) == 1:
+            return terms[0]
+        return self._derivativeSum(terms[0], terms[1])
@@ -0,0 +1,54 @@
+from .Value import Value
+import itertools
+import numpy as np
+
+
+class Placeholder(Value):
+    """
+    Graph input whose value is fed before forward,
+    so one graph can be evaluated on different data.
+    Leading dimension is the batch size and may change between feeds
+    """
+    __slots__ = ("_source",)
+    _mutable = True
+    _reshapeable = True
+
+    # Windows get negative versions, unique within the process, so a
+    # tape never mistakes a window for a fed value or for another window
+    _windows = itertools.count(1)
+
+    def __init__(self, value: np.array):
+        super().__init__(value=value)
+        self._source = self._value
+
+    def feed(self, value: np.array):
+        value = self._safeValue(value)
+        assert value.shape[1:] == self.shape[1:], f"Placeholder expects (n, {self.shape[1:]}), got {value.shape}"
+        self._source = value
+        self._value = value
+        self._shape = value.shape
+        self._version += 1
+
+    def _window(self, start: int, stop: int):
+        """
+        Exposes rows [start, stop) of the fed value, used for chunked evaluation
+        """
+        self._value = self._source[start:stop]
+        self._shape = self._value.shape
+        self._version = -next(Placeholder._windows)
+
+    def _restore(self, value: np.ndarray, version: int):
+        """
+        Exposes value again under its version from before windowing,
+        so nodes evaluated on it are not recomputed
+        """
+        self._value = value
+        self._shape = value.shape
+        self._version = version
+
+    @property
+    def rows(self) -> int:
+        return self._source.shape[0]
+
+    def __copy__(self):
+        return Placeholder(self._value)
@@ -3,23 +3,44 @@ import numpy as np
 
 
 class Value(Graph):
-    def __init__(self, value: np.array):
+    __slots__ = ("_value", "_version", "_frwd_version")
+
+    def __init__(self, value: np.array, copy=False):
+        """
+        :param value: array, number or path to .npy file (memory-mapped)
+        :param copy: copy float arrays instead of referencing them
+        """
         super().__init__()
-        value = self._safeValue(value)
+        value = self._safeValue(value, copy=copy)
         self._value = value
         self._shape = value.shape
         self._checkRequiresGrad()
         self._frwd = self._value
+        # Incremented whenever value is replaced, forward recomputes dependent nodes
+        self._version = 0
+        self._frwd_version = 0
 
-    def forward(self) -> np.ndarray:
-        self._frwd = self._value
+    def _forwardKernel(self):
         return self._value
 
-    def _backward(self):
-        pass
+    def _outdated(self) -> bool:
+        return self._frwd is None or self._frwd_version != self._version
+
+    def _forward(self):
+        super()._forward()
+        self._frwd_version = self._version
+
+    def _backwardKernel(self, grad, frwd):
+        return ()
+
+    def _cseKey(self):
+        # Small constants (e.g. literals of expressions) are merged by content
+        if self._mutable or self._value.size > 16:
+            return None
+        return self._value.dtype.str, self.shape, self._value.tobytes()
 
-    def gradientGraph(self, by):
-        return Value(np.zeros(self.shape))
+    def _gradientGraph(self, by):
+        return self._constantGraph(self.shape, 0.0)
 
     def _graphCopy(self):
         return self
@@ -1,18 +1,84 @@
-import traceback
+import itertools
+import sys
 
+from simplegrad.architecture.Direction import Direction
+from simplegrad.architecture.Precision import getPrecision
 from .Value import Value
 import numpy as np
 
 
 class Variable(Value):
-    def __init__(self, value: np.array, requires_grad=True, def_name=None):
-        super().__init__(value=value)
+    __slots__ = ("_compute", "_packed", "_defined_name", "_definition")
+    _mutable = True
+    _master = True
+
+    # Every variable owns a bit of the masks of nodes depending on it
+    _bits = itertools.count()
+
+    def __init__(self, value: np.array, requires_grad=True, def_name=None, copy=True):
+        super().__init__(value=value, copy=copy)
+        # Master weights are cast to compute dtype on forward (mixed precision)
+        self._compute = getPrecision().compute
+        self._packed = False
         self._requires_grad = requires_grad
-        self._variables_set = {self._id}
-        if def_name == None:
-            (filename, line_number, function_name, text) = traceback.extract_stack()[-2]
-            def_name = text[:text.find('=')].strip()
-        self.defined_name = def_name
+        self._variables_mask = 1 << next(Variable._bits)
+        self._defined_name = def_name
+        # Name is read from the calling line only when it is needed, see defined_name
+        self._definition = None if def_name is not None else self._caller()
+
+    @staticmethod
+    def _caller() -> tuple:
+        """
+        File and line of the code calling a Variable method
+        """
+        frame = sys._getframe(2)
+        return frame.f_code.co_filename, frame.f_lineno, None
+
+    @classmethod
+    def from_arrays(cls, arrays: list, requires_grad=True, names: list = None) -> list:
+        """
+        Creates variables of many arrays at once. Values are copied into
+        one contiguous block, names are inferred from the calling line
+        as name[i] unless given
+
+        :param arrays: arrays or numbers
+        :param names: name of every variable
+        """
+        dtype = getPrecision().master
+        arrays = [np.asarray(array) for array in arrays]
+        block = np.concatenate([array.reshape(-1) for array in arrays]).astype(dtype, copy=False)
+        filename, line, _ = cls._caller()
+        variables = []
+        start = 0
+        for i, array in enumerate(arrays):
+            stop = start + array.size
+            value = block[start:stop].reshape(array.shape)
+            start = stop
+            name = None if names is None else names[i]
+            variable = cls(value, requires_grad=requires_grad, def_name=name or "", copy=False)
+            if name is None:
+                variable._defined_name = None
+                variable._definition = filename, line, i
+            variables.append(variable)
+        return variables
+
+    @property
+    def defined_name(self) -> str:
+        if self._defined_name is None and self._definition is not None:
+            import linecache
+
+            filename, line, index = self._definition
+            text = linecache.getline(filename, line).strip()
+            name = text[:text.find('=')].strip()
+            self._defined_name = name if index is None else f"{name}[{index}]"
+        return self._defined_name
+
+    @defined_name.setter
+    def defined_name(self, name: str):
+        self._defined_name = name
+
+    def _forwardKernel(self):
+        return self._value.astype(self._compute, copy=False)
 
     @property
     def value(self):
@@ -20,15 +86,37 @@ class Variable(Value):
 
     @value.setter
     def value(self, value):
-        self._value = value
+        """
+        Every assignment (including augmented one, e.g. var.value -= step)
+        marks dependent nodes for recomputation. Modifying the array in place
+        through indexing must be followed by an assignment.
+        """
+        if self._packed:
+            # View into a ParameterBuffer is updated in place
+            np.copyto(self._value, value)
+        else:
+            self._value = np.asarray(value, dtype=self._dtype)
+        self._version += 1
+
+    @property
+    def requires_grad(self):
+        return self._requires_grad
+
+    @requires_grad.setter
+    def requires_grad(self, requires_grad):
+        if requires_grad != self._requires_grad:
+            self._requires_grad = requires_grad
+            self._invalidateStructure()
 
-    def gradientGraph(self, by):
-        if by.id == self.id:
-            return Value(np.ones(self.shape))
-        return Value(np.zeros(self.shape))
+    def _gradientGraph(self, by):
+        if isinstance(by, Direction):
+            return by.tangent(self)
+        return self._constantGraph(self.shape, 1.0)
 
     def __copy__(self):
-        return Variable(value=self.value, requires_grad=self._requires_grad)
+        copy = Variable(value=self.value, requires_grad=self._requires_grad, def_name=self._defined_name)
+        copy._definition = self._definition
+        return copy
 
     def _graphCopy(self):
         return self
@@ -0,0 +1,432 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from simplegrad import Value, Variable, Placeholder, profile
+import simplegrad.algo.nn as sgnn
+from simplegrad.algo.nn.Activation import Activation
+from simplegrad.algo.optimize import Adam
+from simplegrad.architecture.Tape import CompiledGraph
+
+
+# Wall-clock comparisons depend on the machine and its load,
+# they run only with SIMPLEGRAD_TIMING=1
+_timing = unittest.skipUnless(os.environ.get("SIMPLEGRAD_TIMING") == "1", "set SIMPLEGRAD_TIMING=1 to run")
+
+
+def _bestOf(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+class ConstructionBenchmarkCase(unittest.TestCase):
+    @staticmethod
+    def _buildChain(depth):
+        x = Variable(1.0, def_name="x")
+        y = x
+        for _ in range(depth):
+            y = y * 1.0001 + x
+        return y
+
+    def test_chain_node_count_linear(self):
+        for depth in (10, 50, 100):
+            graph = self._buildChain(depth)
+            # x, then MulNode and AddNode per step, the scalar is kept in MulNode
+            self.assertEqual(len(graph.topoSorted(onlygrad=False)), 2 * depth + 1)
+
+    @_timing
+    def test_chain_construction_time_linear(self):
+        short = _bestOf(lambda: self._buildChain(100))
+        long = _bestOf(lambda: self._buildChain(400))
+        # Linear construction gives a ratio close to 4, quadratic would give 16
+        self.assertLess(long / short, 8, f"construction time: depth 100 {short:.4f}s, depth 400 {long:.4f}s")
+
+    def test_variable_names_lazy(self):
+        arrays = [np.zeros((1, 8)) for _ in range(100)]
+        import linecache
+        with mock.patch.object(linecache, "getline", wraps=linecache.getline) as getline:
+            variables = [Variable(array) for array in arrays]
+            bulk = Variable.from_arrays(arrays)
+            # Names are not read from the source while variables are created
+            self.assertEqual(getline.call_count, 0)
+            self.assertEqual(variables[0].defined_name, "variables")
+            self.assertEqual(bulk[3].defined_name, "bulk[3]")
+            self.assertEqual(getline.call_count, 2)
+        # Values of from_arrays are views of one block
+        self.assertTrue(all([np.shares_memory(var.value, bulk[0].value.base) for var in bulk]))
+
+    @_timing
+    def test_variable_creation_time(self):
+        arrays = [np.zeros((1, 8)) for _ in range(2000)]
+        values = _bestOf(lambda: [Value(array, copy=True) for array in arrays])
+        variables = _bestOf(lambda: [Variable(array) for array in arrays])
+        bulk = _bestOf(lambda: Variable.from_arrays(arrays))
+        # Names are not read from the stack, a variable costs about as much as a copied value
+        message = f"2000 values {values * 1e3:.1f}ms, variables {variables * 1e3:.1f}ms, from_arrays {bulk * 1e3:.1f}ms"
+        self.assertLess(variables, 3 * values, message)
+        self.assertLess(bulk, 3 * values, message)
+
+    def test_dense_layer_node_count(self):
+        X = Placeholder(np.random.random((16, 4)))
+        y = X
+        for _ in range(3):
+            y = sgnn.DenseLayer(4, "tanh")(y)
+        # X, then weight, bias, MatmulNode, AddNode and activation per layer,
+        # the bias is broadcast by AddNode itself
+        self.assertEqual(len(y.topoSorted(onlygrad=False)), 5 * 3 + 1)
+
+
+def _allocated(fn):
+    """
+    Bytes and number of blocks allocated by fn that are still alive
+    after it returns, and peak bytes allocated while it was running
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        diff = tracemalloc.take_snapshot().compare_to(before, 'filename')
+    finally:
+        tracemalloc.stop()
+    return sum(stat.size_diff for stat in diff), sum(stat.count_diff for stat in diff), peak - start
+
+
+class CompactNodeBenchmarkCase(unittest.TestCase):
+    @staticmethod
+    def _buildSequence(steps, weights):
+        # Unrolled recurrence sharing its weights between steps
+        h = Placeholder(np.ones((1, 4)))
+        for step in range(steps):
+            h = h * weights[step % len(weights)] + 1.0
+        return h
+
+    def test_bytes_per_node(self):
+        weights = [Variable(np.ones((1, 4)), def_name="w") for _ in range(500)]
+        for node in (weights[0], weights[0] * 2, weights[0].sigmoid()):
+            self.assertFalse(hasattr(node, "__dict__"))
+        graphs = []
+        # Masks of variables grow to 500 bits, sets of ids would hold up to 500 entries
+        allocated = _allocated(lambda: graphs.append(self._buildSequence(10000, weights)))[0]
+        perNode = allocated / 20000
+        self.assertLess(perNode, 500, f"{perNode:.0f} bytes per node")
+
+    def test_compiled_chain_nodes(self):
+        weights = [Variable(np.ones((1, 4)), def_name="w")]
+        for steps in (2000, 8000):
+            graph = self._buildSequence(steps, weights).sum()
+            self.assertEqual(len(graph.topoSorted(onlygrad=False)), 2 * steps + 3)
+            # The whole chain is fused into one node of the tape
+            self.assertEqual(len(CompiledGraph(graph, graph._executionPlan())._nodes), 4)
+
+    @_timing
+    def test_creation_rate(self):
+        weights = [Variable(np.ones((1, 4)), def_name="w")]
+        short = _bestOf(lambda: self._buildSequence(5000, weights))
+        long = _bestOf(lambda: self._buildSequence(20000, weights))
+        message = f"{40000 / long:.0f} nodes per second"
+        self.assertLess(long / short, 8, message)
+        # Fusion of one long chain is linear as well
+        tapes = [self._buildSequence(steps, weights).sum() for steps in (2000, 8000)]
+        short = _bestOf(lambda: CompiledGraph(tapes[0], tapes[0]._executionPlan()), repeat=1)
+        long = _bestOf(lambda: CompiledGraph(tapes[1], tapes[1]._executionPlan()), repeat=1)
+        self.assertLess(long / short, 8, f"compile time: 4000 nodes {short:.3f}s, 16000 nodes {long:.3f}s")
+
+
+class AllocationBenchmarkCase(unittest.TestCase):
+    @staticmethod
+    def _buildModel():
+        np.random.seed(0)
+        X = Value(np.random.random((256, 64)))
+        w1 = Variable(np.random.random((64, 64)), def_name="w1")
+        w2 = Variable(np.random.random((64, 1)), def_name="w2")
+        return ((X @ w1).sigmoid() @ w2).sum(), (w1, w2)
+
+    def test_zero_grad_in_place(self):
+        loss, _ = self._buildModel()
+        tape = loss.compile()
+        tape.calcGrad()
+        size, _, peak = _allocated(tape.zeroGrad)
+        self.assertLess(peak, 1024, f"zeroGrad allocated {peak} bytes")
+
+    def test_backward_reuses_buffers(self):
+        loss, variables = self._buildModel()
+        for model in (loss.compile(), loss):
+            model.calcGrad()
+            buffers = [var.grad for var in variables]
+
+            def step():
+                for _ in range(10):
+                    model.zeroGrad()
+                    model.backward()
+
+            size, count, peak = _allocated(step)
+            for var, buffer in zip(variables, buffers):
+                self.assertIs(var.grad, buffer)
+            # Gradients are stored in buffers allocated by the first backward,
+            # later steps only allocate kernel temporaries that are freed
+            self.assertLess(size, 1024, f"{type(model).__name__}: {count} blocks retained")
+
+
+class ChunkedMemoryBenchmarkCase(unittest.TestCase):
+    def test_chunked_loss_peak_memory(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((20000, 16)))
+        y = Placeholder(np.random.random((20000, 1)))
+        w1 = Variable(np.random.random((16, 32)), def_name="w1")
+        w2 = Variable(np.random.random((32, 1)), def_name="w2")
+
+        def peak(chunk_size):
+            tape = (((X @ w1).sigmoid() @ w2 - y) ** 2).sum(chunk_size=chunk_size).compile()
+            tape.calcGrad()
+            tape.zeroGrad()
+            return _allocated(tape.calcGrad)[2]
+
+        full = peak(None)
+        chunked = peak(1000)
+        # Largest intermediate is 20000 x 32 floats
+        self.assertGreater(full, 20000 * 32 * 8)
+        self.assertLess(chunked * 5, full, f"peak memory: full {full} bytes, chunked {chunked} bytes")
+
+
+
+class _CompositeActivation(Activation):
+    """
+    Activations built from elementary nodes, as before fused kernels
+    """
+    def setInput(self, input):
+        x = input
+        if self._activation == "tanh":
+            xNeg = x * -1
+            self._graph = (x.exp() - xNeg.exp()) / (x.exp() + xNeg.exp())
+        elif self._activation == "relu":
+            self._graph = (x > 0) * x
+        elif self._activation == "elu":
+            self._graph = (x > 0) * x + (x <= 0) * 1.0 * (x.exp() - 1)
+        elif self._activation == "softmax":
+            self._graph = x.expSubMax() / x.expSubMax().sum(axis=-1)
+        return self._graph
+
+
+class FusedActivationBenchmarkCase(unittest.TestCase):
+    @staticmethod
+    def _fit(activation):
+        np.random.seed(0)
+        X = np.random.random((512, 32))
+        y = np.eye(10)[np.random.randint(0, 10, 512)]
+        model = sgnn.SequentialModel(layers=[
+            sgnn.DenseLayer(num_neurons=64, activation=activation("tanh")),
+            sgnn.DenseLayer(num_neurons=64, activation=activation("relu")),
+            sgnn.DenseLayer(num_neurons=64, activation=activation("elu")),
+            sgnn.DenseLayer(num_neurons=10, activation=activation("softmax")),
+        ])
+        optimizer = Adam(lr=1e-3)
+        loss = "crossentropy" if activation is Activation else \
+            (lambda y_pred, y_true: (-1 * (y_pred + 1e-8).ln() * y_true).sum())
+        model.fit(X, y, loss=loss, optimizer=optimizer, iterations=1)
+        return model, optimizer
+
+    def test_fused_kernels(self):
+        counts = []
+        for activation in (Activation, _CompositeActivation):
+            model, optimizer = self._fit(activation)
+            with profile() as profiler:
+                optimizer.step()
+            calls = sum([row["calls"] for row in profiler.nodes()])
+            counts.append((len(model._graph.topoSorted(onlygrad=False)), calls))
+        (fusedNodes, fusedCalls), (compositeNodes, compositeCalls) = counts
+        self.assertLess(fusedNodes * 2, compositeNodes)
+        self.assertLess(fusedCalls, compositeCalls, f"kernel calls per step: fused {fusedCalls}, "
+                                                    f"composite {compositeCalls}")
+
+    @_timing
+    def test_fused_step_faster(self):
+        times = []
+        for activation in (Activation, _CompositeActivation):
+            model, optimizer = self._fit(activation)
+            times.append(_bestOf(lambda: [optimizer.step() for _ in range(10)]) / 10)
+        fused, composite = times
+        self.assertLess(fused, composite, f"step time: fused {fused * 1e3:.2f}ms, composite {composite * 1e3:.2f}ms")
+
+
+class FusionBenchmarkCase(unittest.TestCase):
+    def test_fused_chain_allocates_less(self):
+        np.random.seed(0)
+        data = np.random.random((100000, 4))
+        X = Placeholder(data)
+        y = Placeholder(np.random.random((100000, 1)))
+        w = Variable(np.random.random((4, 1)), def_name="w")
+        pred = (X @ w).tanh() * 2 + 1
+        loss = ((pred - y) ** 2).sum() / 100000
+        plan = loss._executionPlan()
+
+        def peak(fuse):
+            tape = CompiledGraph(loss, plan, fuse=fuse)
+            tape.calcGrad()
+
+            def step():
+                X.feed(data)
+                tape.zeroGrad()
+                tape.calcGrad()
+
+            return _allocated(step)[2], len(tape._nodes)
+
+        fused, fusedNodes = peak(True)
+        unfused, unfusedNodes = peak(False)
+        self.assertLess(fusedNodes, unfusedNodes)
+        # Chain temporaries are written into reused buffers
+        self.assertLess(fused, unfused * 0.8, f"step peak memory: fused {fused} bytes, unfused {unfused} bytes")
+
+
+class FlatOptimizerBenchmarkCase(unittest.TestCase):
+    @staticmethod
+    def _optimizer(flat):
+        np.random.seed(0)
+        variables = [Variable(np.random.random((8, 8)), def_name="w") for _ in range(100)]
+        loss = variables[0].sum()
+        for var in variables[1:]:
+            loss = loss + (var ** 2).sum()
+        optimizer = Adam(model=loss, variables=variables, lr=1e-3, flat=flat)
+        optimizer.step()
+        # Gradients are kept, only the update of variables is measured
+        optimizer._calcGrad = lambda model=None: True
+        return optimizer
+
+    def test_flat_update_in_place(self):
+        peaks = [_allocated(self._optimizer(flat).step)[2] for flat in (True, False)]
+        flat, loop = peaks
+        # In-place operations on the buffer, temporaries of every variable otherwise
+        self.assertLess(flat, 1024, f"flat update allocated {flat} bytes")
+        self.assertGreater(loop, 100 * 8 * 8 * 8)
+
+    @_timing
+    def test_flat_update_faster(self):
+        flat, loop = [_bestOf(lambda: [optimizer.step() for _ in range(20)]) / 20
+                      for optimizer in (self._optimizer(True), self._optimizer(False))]
+        # A few operations on the buffer instead of several per variable
+        self.assertLess(flat * 3, loop, f"update time of 100 variables: flat {flat * 1e6:.0f}us, "
+                                        f"per variable {loop * 1e6:.0f}us")
+
+
+class CheckpointMemoryBenchmarkCase(unittest.TestCase):
+    def test_checkpointed_peak_memory(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((2000, 32)))
+        y = Placeholder(np.random.random((2000, 1)))
+        layers = [sgnn.DenseLayer(num_neurons=32, activation="tanh") for _ in range(16)]
+        layers.append(sgnn.DenseLayer(num_neurons=1, activation="linear"))
+        graph = X
+        for layer in layers:
+            graph = layer(graph).checkpoint()
+        loss = ((y - graph) ** 2).sum()
+
+        def peak(checkpoint):
+            # Peak of a fresh tape, every forward value and gradient it keeps is counted
+            def step():
+                tape = CompiledGraph(loss, loss._executionPlan(), checkpoint=checkpoint)
+                tape.zeroGrad()
+                tape.calcGrad()
+            return _allocated(step)[2]
+
+        full = peak(None)
+        grads = [layer.getTrainable()[0].grad.copy() for layer in layers]
+        layered = peak("marked")
+        for layer, grad in zip(layers, grads):
+            np.testing.assert_allclose(layer.getTrainable()[0].grad, grad)
+        # Every layer keeps a few 2000 x 32 arrays without checkpointing
+        self.assertGreater(full, 16 * 2000 * 32 * 8)
+        self.assertLess(layered * 2, full, f"peak memory: full {full} bytes, per layer checkpoints {layered} bytes")
+
+
+class ParallelBenchmarkCase(unittest.TestCase):
+    @staticmethod
+    def _branches():
+        np.random.seed(0)
+        X = Placeholder(np.random.random((512, 512)))
+        ws = [Variable(np.random.random((512, 512)) / 512, def_name="w") for _ in range(4)]
+        # Independent branches of large matmuls, joined by a sum
+        loss = (X @ ws[0]).tanh().sum()
+        for w in ws[1:]:
+            loss = loss + (X @ w).tanh().sum()
+        return X, ws, loss
+
+    @staticmethod
+    def _stepTime(X, ws, loss, workers):
+        tape = loss.compile(workers=workers)
+        tape.zeroGrad()
+        tape.calcGrad()
+
+        def step():
+            X.feed(X.value + 0)
+            tape.zeroGrad()
+            tape.calcGrad()
+
+        return _bestOf(step), [w.grad.copy() for w in ws]
+
+    def test_parallel_branches(self):
+        X, ws, loss = self._branches()
+        serial, expected = self._stepTime(X, ws, loss, None)
+        parallel, grads = self._stepTime(X, ws, loss, 4)
+        for grad, reference in zip(grads, expected):
+            np.testing.assert_allclose(grad, reference)
+
+    @_timing
+    def test_parallel_branches_faster(self):
+        X, ws, loss = self._branches()
+        serial, _ = self._stepTime(X, ws, loss, None)
+        parallel, _ = self._stepTime(X, ws, loss, 4)
+        message = f"step time: serial {serial * 1e3:.1f}ms, 4 threads {parallel * 1e3:.1f}ms"
+        if (os.cpu_count() or 1) < 2:
+            self.skipTest(f"single core, {message}")
+        self.assertLess(parallel, serial, message)
+
+
+class MappedLoadBenchmarkCase(unittest.TestCase):
+    def test_load_does_not_read_weights(self):
+        np.random.seed(0)
+        model = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=2000, activation="tanh"),
+                                             sgnn.DenseLayer(num_neurons=1, activation="linear")])
+        X = np.random.random((4, 1000))
+        expected = model.predict(X)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.sgw")
+            model.save(path)
+            loaded = []
+            # 16MB of weights
+            peak = _allocated(lambda: loaded.append(sgnn.SequentialModel.load(path)))[2]
+            np.testing.assert_array_equal(loaded[0].predict(X), expected)
+        self.assertLess(peak, 2 ** 20, f"peak memory of load: {peak} bytes")
+
+
+class ImportTimeBenchmarkCase(unittest.TestCase):
+    def test_lazy_imports(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        report = subprocess.run([sys.executable, "-X", "importtime", "-c", "import simplegrad, simplegrad.algo.nn"],
+                                cwd=root, capture_output=True, text=True, check=True).stderr
+        # Lines are "import time: self [us] | cumulative | package"
+        modules = set([line.split("|")[-1].strip() for line in report.splitlines() if line.startswith("import time:")])
+        self.assertIn("simplegrad.algo.nn.Model", modules)
+        # Imported by the features using them
+        lazy = {"graphviz", "tqdm", "tqdm.auto", "concurrent.futures", "multiprocessing",
+                "multiprocessing.shared_memory", "json", "simplegrad.algo.nn.DataParallel",
+                "simplegrad.algo.optimize.Adam", "simplegrad.algo.optimize.GD"}
+        self.assertEqual(lazy & modules, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+import numpy as np
+import simplegrad.algo.nn as sgnn
+from simplegrad import Placeholder, Value, Variable
+from simplegrad.algo.optimize import Newton, NewtonCG
+
+from .Model import _dataset
+
+
+class DerivativesTestCase(unittest.TestCase):
+    @staticmethod
+    def _classifier():
+        np.random.seed(0)
+        X = Placeholder(np.random.random((6, 3)))
+        labels = np.eye(2)[np.random.randint(0, 2, 6)]
+        w = Variable(np.random.random((3, 4)) - 0.5)
+        b = Variable(np.zeros((1, 4)))
+        v = Variable(np.random.random((4, 2)) - 0.5)
+        loss = ((X @ w + b).tanh() @ v).softmax().crossentropy(labels) + (w ** 2).sum() * 0.1
+        return loss, [w, b, v]
+
+    def _assertHvp(self, loss, variables):
+        vectors = [np.random.random(var.shape) for var in variables]
+        product = loss.hvp(variables, vectors)
+
+        def gradients(shift):
+            for var, vector in zip(variables, vectors):
+                var.value = var.value + shift * vector
+            loss.zeroGrad()
+            loss.calcGrad()
+            return [var.grad.copy() for var in variables]
+
+        eps = 1e-6
+        above = gradients(eps)
+        below = gradients(-2 * eps)
+        for hv, up, down in zip(product, above, below):
+            np.testing.assert_allclose(hv, (up - down) / (2 * eps), atol=1e-8)
+        # Variable gradients are not overwritten by the product
+        np.testing.assert_allclose(variables[0].grad, below[0])
+
+    def test_hvp(self):
+        self._assertHvp(*self._classifier())
+
+    def test_hvp_deep_chain(self):
+        x = Variable(0.5)
+        y = x
+        for _ in range(1000):
+            y = y * 1.0001 + x
+        # Deeper than the recursion limit of Python
+        self._assertHvp((y ** 2).sum() + (x ** 3).sum(), [x])
+
+    def test_hvp_transpose(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((5, 3)))
+        w = Variable(np.random.random((3, 2)) - 0.5)
+        loss = (w.T @ X.T).tanh().sum() + ((w.T @ w) ** 2).sum()
+        self._assertHvp(loss, [w])
+
+    def test_hvp_graph_reused(self):
+        loss, variables = self._classifier()
+        vectors = [np.ones(var.shape) for var in variables]
+        loss.hvp(variables, vectors)
+        tapes = dict(loss._directional)
+        loss.hvp(variables, [vector * 2 for vector in vectors])
+        self.assertEqual(loss._directional, tapes)
+
+    def test_jvp(self):
+        loss, variables = self._classifier()
+        np.random.seed(1)
+        tangents = [np.random.random(var.shape) for var in variables]
+        value, tangent = loss.jvp(variables, tangents)
+        loss.zeroGrad()
+        loss.backward()
+        self.assertEqual(value[0, 0], loss.scalar)
+        # Derivative along tangents is the gradient dotted with them
+        expected = sum([(var.grad * t).sum() for var, t in zip(variables, tangents)])
+        self.assertAlmostEqual(tangent[0, 0], expected)
+
+    def test_jvp_many_outputs(self):
+        np.random.seed(0)
+        a = np.random.random((5, 3)) * 4 - 2
+        x = Variable(a)
+        names = ["tanh", "relu", "elu", "sigmoid", "exp", "abs", "softmax", "log_softmax", "expSubMax"]
+        for name in names:
+            out = (getattr(x, name)() * 2 + x.T.sum(axis=0).T) ** 2
+            direction = np.random.random(a.shape)
+            _, tangent = out.jvp([x], [direction])
+            x.value = a + 1e-6 * direction
+            above = out.forward().copy()
+            x.value = a - 1e-6 * direction
+            below = out.forward().copy()
+            x.value = a
+            np.testing.assert_allclose(tangent, (above - below) / 2e-6, rtol=1e-5, atol=1e-6, err_msg=name)
+
+    def test_jvp_chunked(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((10, 3)))
+        w = Variable(np.random.random((3, 1)))
+        direction = np.random.random((3, 1))
+        full = ((X @ w).tanh() ** 2).sum()
+        chunked = ((X @ w).tanh() ** 2).sum(chunk_size=4)
+        np.testing.assert_allclose(chunked.jvp([w], [direction])[1], full.jvp([w], [direction])[1])
+
+    def test_gradient_graph_simplified(self):
+        x, y = Variable(2.0), Variable(3.0)
+        # Zero term of the product rule is dropped, derivative by one is the factor itself
+        self.assertIs((x * y).gradientGraph(by=x), y)
+        f = (x * y).exp()
+        self.assertIs(f.gradientGraph(by=x), f.gradientGraph(by=x))
+
+    def test_nested_derivatives(self):
+        x = Variable(0.7)
+        f = (x ** 4).tanh() * x.exp()
+        derivative = f
+        for _ in range(3):
+            report = derivative.derivativeReport(by=x)
+            self.assertLess(report["simplified"], report["naive"])
+            derivative = derivative.gradientGraph(by=x)
+
+        def reference(x):
+            return np.tanh(x ** 4) * np.exp(x)
+
+        step = 1e-3
+        third = (reference(0.7 + 2 * step) - 2 * reference(0.7 + step)
+                 + 2 * reference(0.7 - step) - reference(0.7 - 2 * step)) / (2 * step ** 3)
+        self.assertAlmostEqual(derivative.forward()[0, 0], third, delta=1e-2)
+        self.assertLess(report["simplified"] * 2, report["naive"])
+
+    def test_newton(self):
+        x, y = Variable(1.0), Variable(2.0)
+        f = (x - 3) ** 2 + x * y + 2 * (y + 1) ** 2
+        optimizer = Newton(model=f, variables=[x, y])
+        optimizer.step()
+        self.assertAlmostEqual(x.scalar, 4.0)
+        self.assertAlmostEqual(y.scalar, -2.0)
+        report = optimizer.report
+        self.assertLess(report["simplified"], report["naive"])
+
+    def test_newton_deep_chain(self):
+        x = Variable(0.5)
+        y = x
+        for _ in range(1000):
+            y = y * 1.0001 + x
+        # Deeper than the recursion limit of Python
+        optimizer = Newton(model=(y - 2) ** 2, variables=[x])
+        optimizer.step()
+        self.assertAlmostEqual(y.forward()[0, 0], 2.0)
+        report = optimizer.report
+        self.assertLess(report["simplified"], report["naive"])
+
+    def test_newton_cg_quadratic(self):
+        np.random.seed(0)
+        A = np.random.random((10, 3))
+        target = np.random.random((10, 2))
+        w = Variable(np.zeros((3, 2)))
+        loss = ((Value(A) @ w - Value(target)) ** 2).sum()
+        NewtonCG(model=loss, variables=[w]).step()
+        # Conjugate gradients solve a quadratic in as many iterations as it has parameters
+        np.testing.assert_allclose(w.value, np.linalg.lstsq(A, target, rcond=None)[0], atol=1e-8)
+
+    def test_newton_cg_rosenbrock(self):
+        x, y = Variable(-0.3), Variable(2.2)
+        f = (1 - x) ** 2 + 100 * (y - x ** 2) ** 2
+        optimizer = NewtonCG(model=f, variables=[x, y])
+        for _ in range(30):
+            optimizer.step()
+        self.assertAlmostEqual(x.scalar, 1.0)
+        self.assertAlmostEqual(y.scalar, 1.0)
+
+    def test_newton_cg_fit(self):
+        X, y = _dataset()
+        np.random.seed(1)
+        model = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=1, activation="linear")])
+        # Batches of 32 and 24 rows use separate derivative graphs
+        model.fit(X, y, optimizer=NewtonCG(), batch_size=32, epochs=3)
+        self.assertLess(((model.predict(X) - y) ** 2).mean(), 1e-10)
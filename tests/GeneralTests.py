@@ -1,7 +1,17 @@
+import os
+import tempfile
 import unittest
 import numpy as np
 from simplegrad import Value, Variable
 from .Operations import OperationsTestCase
+from .Graph import GraphTestCase
+from .Model import ModelTestCase
+from .Precision import PrecisionTestCase
+from .Derivatives import DerivativesTestCase
+from .Benchmarks import ConstructionBenchmarkCase, AllocationBenchmarkCase, ChunkedMemoryBenchmarkCase, \
+    FusedActivationBenchmarkCase, FusionBenchmarkCase, FlatOptimizerBenchmarkCase, \
+    ParallelBenchmarkCase, CheckpointMemoryBenchmarkCase, CompactNodeBenchmarkCase, \
+    ImportTimeBenchmarkCase, MappedLoadBenchmarkCase
 
 class GeneralTestCase(unittest.TestCase):
     def test_ValueInitInt(self):
@@ -29,6 +39,48 @@ class GeneralTestCase(unittest.TestCase):
             self.assertEqual((aVal.forward() != val).sum(), 0)
 
 
+    def test_VariableName(self):
+        weight = Variable(np.zeros((2, 2)))
+        self.assertIsNone(weight._defined_name)
+        self.assertEqual(weight.defined_name, "weight")
+        self.assertEqual(Variable(1.0, def_name="bias").defined_name, "bias")
+        self.assertEqual(weight.__copy__().defined_name, "weight")
+        self.assertIn("<weight>", weight._dot_description(False))
+
+    def test_VariableFromArrays(self):
+        arrays = [np.random.random((3, 2)), np.arange(4.0), 2.0]
+        params = Variable.from_arrays(arrays)
+        self.assertEqual([var.shape for var in params], [(3, 2), (4, 1), (1, 1)])
+        for var, array in zip(params, arrays):
+            self.assertEqual((var.value != np.reshape(array, var.shape)).sum(), 0)
+            self.assertTrue(var.requires_grad)
+        # Values are adjacent views into one block, the arrays are copied
+        address = lambda var: var.value.__array_interface__["data"][0]
+        self.assertEqual(address(params[1]), address(params[0]) + 6 * 8)
+        self.assertEqual(address(params[2]), address(params[1]) + 4 * 8)
+        self.assertFalse(np.shares_memory(params[0].value, arrays[0]))
+        self.assertEqual([var.defined_name for var in params], ["params[0]", "params[1]", "params[2]"])
+        named = Variable.from_arrays(arrays[:2], requires_grad=False, names=["w", "b"])
+        self.assertEqual([var.defined_name for var in named], ["w", "b"])
+        self.assertFalse(named[0].requires_grad)
+
+    def test_ValueNoCopy(self):
+        val = np.random.random((3, 4))
+        self.assertIs(Value(val).forward(), val)
+        self.assertTrue(np.shares_memory(Value(val[:, 0]).forward(), val))
+        self.assertIsNot(Variable(val).forward(), val)
+
+    def test_ValueMemmap(self):
+        val = np.random.random((50, 4))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.npy")
+            np.save(path, val)
+            for source in (path, np.load(path, mmap_mode='r')):
+                aVal = Value(source)
+                self.assertIsInstance(aVal.forward(), np.memmap)
+                self.assertEqual((aVal.forward() != val).sum(), 0)
+                del aVal
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,457 @@
+from simplegrad import Value, Variable, Placeholder, profile
+from simplegrad.implementation.operations.LambdaNode import LambdaNode
+from simplegrad.implementation.operations.FusedNode import FusedNode
+from simplegrad.architecture.Tape import CompiledGraph
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+
+
+class GraphTestCase(unittest.TestCase):
+    def test_deep_graph_backward(self):
+        x = Variable(1.0)
+        y = x
+        for _ in range(5000):
+            y = y * 1.0 + x
+        y.calcGrad()
+        self.assertAlmostEqual(y.scalar, 5001)
+        self.assertAlmostEqual(x.grad[0, 0], 5001)
+
+    def test_shared_subgraph_visited_once(self):
+        x = Variable(0.5)
+        y = x
+        for _ in range(60):
+            y = y * y
+        nodes = y.topoSorted(onlygrad=False)
+        self.assertEqual(len(nodes), len({node.id for node in nodes}))
+        y.calcGrad()
+        y.zeroGrad()
+        self.assertEqual(x.grad[0, 0], 0)
+
+    def test_tanh_grad(self):
+        for v in [-2.0, -0.3, 0.0, 0.7]:
+            x = Variable(v)
+            f = x.tanh()
+            f.calcGrad()
+            self.assertAlmostEqual(f.scalar, np.tanh(v))
+            self.assertAlmostEqual(x.grad[0, 0], 1 - np.tanh(v) ** 2)
+
+    def test_plan_cached_until_structure_changes(self):
+        x = Variable(2.0)
+        z = Variable(3.0)
+        f = x * z + 1
+        self.assertIs(f.topoSorted(), f.topoSorted())
+        self.assertIn(z.id, [node.id for node in f.topoSorted()])
+
+        z.requires_grad = False
+        self.assertNotIn(z.id, [node.id for node in f.topoSorted()])
+        f.zeroGrad()
+        f.calcGrad()
+        self.assertAlmostEqual(x.grad[0, 0], 3)
+
+        z.requires_grad = True
+        f.zeroGrad()
+        f.calcGrad()
+        self.assertAlmostEqual(z.grad[0, 0], 2)
+
+    def test_compiled_matches_graph(self):
+        np.random.seed(0)
+        a = Variable(np.random.random((4, 3)))
+        b = Variable(np.random.random((3, 2)))
+        c = Variable(np.random.random((1, 2)))
+        f = ((a @ b + c).sigmoid() * 2 - (a @ b).exp() / 3 + (a.sum() > 0) * c).sum()
+
+        f.calcGrad()
+        expected = [f.scalar] + [v.grad.copy() for v in (a, b, c)]
+        f.zeroGrad()
+
+        tape = f.compile()
+        self.assertIs(tape, f.compile())
+        for _ in range(2):
+            tape.zeroGrad()
+            tape.calcGrad()
+            self.assertAlmostEqual(tape.scalar, expected[0])
+            for v, grad in zip((a, b, c), expected[1:]):
+                np.testing.assert_allclose(v.grad, grad)
+
+    def test_compiled_follows_variable_updates(self):
+        x = Variable(2.0)
+        f = x * x
+        tape = f.compile()
+        tape.calcGrad()
+        self.assertAlmostEqual(x.grad[0, 0], 4)
+        x.value -= 1
+        tape.zeroGrad()
+        tape.calcGrad()
+        self.assertAlmostEqual(f.scalar, 1)
+        self.assertAlmostEqual(x.grad[0, 0], 2)
+
+    @staticmethod
+    def _countingGraph():
+        calls = {"a": 0, "b": 0}
+
+        def counted(key):
+            def forward(x):
+                calls[key] += 1
+                return x * 2
+            return forward
+
+        a = Variable(1.0)
+        b = Variable(2.0)
+        left = LambdaNode(a, counted("a"), lambda grad, frwd, input: grad * 2)
+        right = LambdaNode(b, counted("b"), lambda grad, frwd, input: grad * 2)
+        calls["a"] = calls["b"] = 0
+        return left * right, a, b, calls
+
+    def test_forward_recomputes_only_changed(self):
+        for compiled in (False, True):
+            f, a, b, calls = self._countingGraph()
+            model = f.compile() if compiled else f
+            self.assertAlmostEqual(model.forward()[0, 0], 8)
+            self.assertEqual(calls, {"a": 1, "b": 1})
+
+            model.forward()
+            self.assertEqual(calls, {"a": 1, "b": 1})
+
+            a.value = np.array([[3.0]])
+            self.assertAlmostEqual(model.forward()[0, 0], 24)
+            self.assertEqual(calls, {"a": 2, "b": 1})
+
+            b.value -= 1
+            self.assertAlmostEqual(model.forward()[0, 0], 12)
+            self.assertEqual(calls, {"a": 2, "b": 2})
+
+    def test_roots_sharing_subgraph(self):
+        v = Variable(1.0)
+        shared = v * 3
+        a = shared + 1
+        b = shared * 2
+        self.assertAlmostEqual(b.forward()[0, 0], 6)
+        v.value = np.array([[10.0]])
+        # Shared node was recomputed by forward of a, b must still see it changed
+        self.assertAlmostEqual(a.forward()[0, 0], 31)
+        self.assertAlmostEqual(b.forward()[0, 0], 60)
+        self.assertAlmostEqual(a.forward()[0, 0], 31)
+
+    def test_frozen_variable_follows_updates(self):
+        x = Variable(2.0, requires_grad=False)
+        w = Variable(3.0)
+        f = x * w
+        tape = f.compile()
+        tape.calcGrad()
+        self.assertAlmostEqual(w.grad[0, 0], 2)
+        x.value = np.array([[5.0]])
+        tape.zeroGrad()
+        tape.calcGrad()
+        self.assertAlmostEqual(f.scalar, 15)
+        self.assertAlmostEqual(w.grad[0, 0], 5)
+
+    def test_placeholder_batch_size(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((5, 3)))
+        w = Variable(np.random.random((3, 2)))
+        b = Variable(np.random.random((1, 2)))
+        f = ((X @ w + b).sigmoid() * 2).sum()
+        for model in (f, f.compile()):
+            for rows in (5, 2, 9):
+                data = np.random.random((rows, 3))
+                X.feed(data)
+                model.zeroGrad()
+                model.calcGrad()
+
+                s = 1 / (1 + np.exp(-(data @ w.value + b.value)))
+                self.assertAlmostEqual(f.scalar, (s * 2).sum())
+                np.testing.assert_allclose(b.grad, (2 * s * (1 - s)).sum(axis=0, keepdims=True))
+                np.testing.assert_allclose(w.grad, data.T @ (2 * s * (1 - s)))
+        self.assertIs(f.compile(), f.compile())
+
+    def test_chunked_sum(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((23, 3)))
+        y = Placeholder(np.random.random((23, 1)))
+        w = Variable(np.random.random((3, 1)))
+        b = Variable(0.5)
+
+        def loss(chunk_size):
+            return (((X @ w + b).sigmoid() - y) ** 2).sum(chunk_size=chunk_size)
+
+        full = loss(None)
+        full.calcGrad()
+        expected = [full.scalar, w.grad.copy(), b.grad.copy()]
+
+        chunked = loss(5)
+        for model in (chunked, chunked.compile()):
+            for _ in range(2):
+                model.zeroGrad()
+                model.calcGrad()
+                self.assertAlmostEqual(chunked.scalar, expected[0])
+                np.testing.assert_allclose(w.grad, expected[1])
+                np.testing.assert_allclose(b.grad, expected[2])
+
+        X.feed(np.random.random((11, 3)))
+        y.feed(np.random.random((11, 1)))
+        full.zeroGrad()
+        full.calcGrad()
+        self.assertAlmostEqual(chunked.compile().forward()[0, 0], full.scalar)
+
+    def test_chunked_sum_keeps_inputs_unchanged(self):
+        np.random.seed(0)
+        data = np.random.random((23, 3))
+        X = Placeholder(data)
+        w = Variable(np.random.random((3, 1)))
+        # Nodes outside of the chunked sum read the same placeholder
+        f = (X @ w).sum(chunk_size=5) + (X * 2).sum()
+        for model in (f, f.compile()):
+            model.forward()
+            with profile() as profiler:
+                value = model.forward()
+            self.assertEqual(profiler.nodes(), [])
+            self.assertAlmostEqual(value[0, 0], (data @ w.value).sum() + 2 * data.sum())
+
+            data = np.random.random((23, 3))
+            X.feed(data)
+            with profile() as profiler:
+                value = model.forward()
+            self.assertGreater(len(profiler.nodes()), 0)
+            self.assertAlmostEqual(value[0, 0], (data @ w.value).sum() + 2 * data.sum())
+
+    def test_value_only_graph(self):
+        f = Value(2) * Value(3) + 1
+        self.assertFalse(f.requires_grad)
+        self.assertEqual(f.topoSorted(), [])
+        self.assertAlmostEqual(f.forward()[0, 0], 7)
+
+    def test_rewrite(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((4, 3)))
+        w = Variable(np.random.random((3, 2)))
+        b = Variable(np.random.random((1, 2)))
+        logits = X @ w + b * (Value(2) * Value(3) - 5)
+        probs = logits.expSubMax() / logits.expSubMax().sum(axis=-1)
+        loss = (probs - 0.5).sum() + ((probs - 0.5) ** 2).sum()
+
+        X.feed(np.random.random((1, 3)))
+        tape = loss.compile()
+        report = tape.report
+        # Second expSubMax and repeated "- 0.5", scalars are parameters of the node
+        self.assertEqual(report["duplicates"], 2)
+        # Value(2) * Value(3) - 5 becomes one Value
+        self.assertEqual(report["folded"], 2)
+        self.assertGreater(report["removed"], report["duplicates"])
+        self.assertIs(tape.value(logits.expSubMax()), None)
+
+        for rows in (1, 4):
+            X.feed(np.random.random((rows, 3)))
+            loss.zeroGrad()
+            loss.calcGrad()
+            expected = (loss.scalar, w.grad.copy(), b.grad.copy())
+            tape.zeroGrad()
+            tape.calcGrad()
+            self.assertAlmostEqual(loss.scalar, expected[0])
+            np.testing.assert_allclose(w.grad, expected[1], atol=1e-12)
+            np.testing.assert_allclose(b.grad, expected[2], atol=1e-12)
+            # Binary nodes broadcast their operands without BroadcastNode
+            self.assertEqual(tape.report["broadcasts"], 0)
+
+    def test_rewrite_opt_in(self):
+        from simplegrad.implementation.extensions.Graph_operations import Graph
+
+        class Noise(Graph):
+            # Custom node without _cseKey(), equal nodes differ in value
+            def __init__(self, value):
+                super().__init__()
+                self._children = [value]
+                self._shape = value.shape
+                self._checkRequiresGrad()
+
+            def _forwardKernel(self, input):
+                return input + np.random.random(input.shape)
+
+            def _backwardKernel(self, grad, frwd, input):
+                return (grad,)
+
+            def _gradientGraph(self, by):
+                return self._children[0].gradientGraph(by)
+
+            def __copy__(self):
+                return Noise(self._children[0])
+
+            def _graphCopy(self):
+                return Noise(self._children[0]._graphCopy())
+
+        x = Variable(np.zeros((3, 1)))
+        constant = Value(np.arange(3.0)).broadcast_to((3, 2))
+        loss = (Noise(x) - Noise(x)).abs().sum() + (x * constant).sum()
+        report = loss.compile().report
+        self.assertEqual(report["duplicates"], 0)
+        # Broadcasts have fixed shapes, a broadcast of a constant is a constant
+        self.assertEqual(report["folded"], 1)
+
+    def test_parallel_tape(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((20, 6)))
+        ws = [Variable(np.random.random((6, 6)) - 0.5) for _ in range(4)]
+        shared = (X @ ws[0]).tanh()
+        # Branches write gradients into shared nodes and variables
+        loss = (X @ ws[1]).sum(chunk_size=7) + ((X @ ws[1]) * (X @ ws[2]).sum(chunk_size=5)).sum()
+        for w in ws:
+            loss = loss + ((shared @ w).sigmoid() * shared).sum()
+        serial = loss.compile()
+        parallel = loss.compile(workers=4)
+        for rows in (20, 9, 20):
+            X.feed(np.random.random((rows, 6)))
+            serial.zeroGrad()
+            serial.calcGrad()
+            expected = (serial.scalar, [w.grad.copy() for w in ws])
+            parallel.zeroGrad()
+            parallel.calcGrad()
+            self.assertAlmostEqual(parallel.scalar, expected[0])
+            for w, grad in zip(ws, expected[1]):
+                np.testing.assert_allclose(w.grad, grad)
+
+    def test_parallel_tapes_share_threads(self):
+        import threading
+
+        x = Variable(np.ones((3, 3)))
+        loss = ((x @ x).tanh() + (x @ x.T).sigmoid()).sum()
+        threads = threading.active_count()
+        first = CompiledGraph(loss, loss._executionPlan(), workers=3)
+        for _ in range(10):
+            tape = CompiledGraph(loss, loss._executionPlan(), workers=3)
+            tape.forward()
+        self.assertIs(tape._executor, first._executor)
+        self.assertLessEqual(threading.active_count(), threads + 3)
+
+    def test_checkpointed_tape(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((20, 6)))
+        ws = [Variable(np.random.random((6, 6)) - 0.5) for _ in range(4)]
+        first = (X @ ws[0]).tanh().checkpoint()
+        hidden = first
+        for w in ws[1:]:
+            hidden = (hidden @ w).sigmoid().checkpoint()
+        # Skip connection reads a value of the first segment in the last one
+        output = hidden * first
+        loss = (output ** 2).sum() + output.sum(chunk_size=7)
+        tapes = [loss.compile(checkpoint=checkpoint) for checkpoint in (None, 1, 3, "marked")]
+        for rows in (20, 9, 20):
+            X.feed(np.random.random((rows, 6)))
+            results = []
+            for tape in tapes:
+                tape.zeroGrad()
+                tape.calcGrad()
+                results.append((tape.scalar, [w.grad.copy() for w in ws]))
+            for scalar, grads in results[1:]:
+                self.assertAlmostEqual(scalar, results[0][0])
+                for grad, expected in zip(grads, results[0][1]):
+                    np.testing.assert_allclose(grad, expected)
+        # Checkpoints are kept, intermediate values and gradients are released
+        tape = tapes[-1]
+        self.assertIsNotNone(tape.value(hidden))
+        self.assertIsNone(tape.value(output))
+        self.assertIsNone(tape.grad(hidden))
+        self.assertIsNotNone(tape.grad(ws[0]))
+
+    def test_profiler(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((10, 3)))
+        w = Variable(np.random.random((3, 2)))
+        loss = ((X @ w).sigmoid() ** 2).sum()
+        tape = loss.compile()
+        with profile(trace=True) as profiler:
+            for _ in range(3):
+                # Kernels run only for changed inputs
+                X.feed(np.random.random((10, 3)))
+                tape.zeroGrad()
+                tape.calcGrad()
+            loss.zeroGrad()
+            loss.calcGrad()
+        ops = {(row["op"], row["phase"]): row for row in profiler.ops()}
+        self.assertEqual(ops[("MatmulNode", "forward")]["calls"], 4)
+        self.assertEqual(ops[("MatmulNode", "backward")]["calls"], 4)
+        self.assertEqual(ops[("MatmulNode", "forward")]["output_bytes"], 4 * 10 * 2 * 8)
+        # Recursive backward visits the sigmoid, the tape runs it fused with the power
+        self.assertIn(("Sigmoid", "backward"), ops)
+        self.assertIn(("Fused", "forward"), ops)
+        times = [row["time"] for row in profiler.nodes()]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+        # Nothing is recorded once the profiler is left
+        calls = sum([row["calls"] for row in profiler.nodes()])
+        X.feed(np.random.random((10, 3)))
+        tape.zeroGrad()
+        tape.calcGrad()
+        self.assertEqual(sum([row["calls"] for row in profiler.nodes()]), calls)
+        self.assertEqual(sum([row["calls"] for row in profiler.ops()]), calls)
+
+        self.assertIn("MatmulNode", profiler.to_table())
+        self.assertEqual(len(profiler.to_table(by="node", limit=2).split("\n")), 3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            profiler.to_chrome_trace(path)
+            with open(path) as file:
+                events = json.load(file)["traceEvents"]
+            self.assertEqual(len(events), sum([row["calls"] for row in profiler.nodes()]))
+            self.assertTrue(all([event["ph"] == "X" and event["dur"] >= 0 for event in events]))
+        self.assertEqual(json.loads(profiler.to_json())["ops"], profiler.ops())
+        self.assertIn("ms", loss.to_dot(profiler=profiler).source)
+
+    def test_profiler_memory_bounded(self):
+        X = Placeholder(np.random.random((4, 3)))
+        w = Variable(np.random.random((3, 2)))
+        tape = ((X @ w) ** 2).sum().compile()
+        for trace, limit in ((False, 0), (True, 5)):
+            with profile(trace=trace, trace_limit=limit) as profiler:
+                for _ in range(20):
+                    X.feed(np.random.random((4, 3)))
+                    tape.zeroGrad()
+                    tape.calcGrad()
+            calls = sum([row["calls"] for row in profiler.nodes()])
+            self.assertGreaterEqual(calls, 20 * 2)
+            # Statistics stay one row per node and phase
+            self.assertLessEqual(len(profiler.nodes()), 8)
+            if trace:
+                self.assertEqual(len(profiler._events), limit)
+                self.assertEqual(profiler.dropped, calls - limit)
+            else:
+                self.assertIsNone(profiler._events)
+                with self.assertRaises(AssertionError):
+                    profiler.to_chrome_trace(os.devnull)
+
+    def test_elementwise_fusion(self):
+        np.random.seed(0)
+        X = Placeholder(np.random.random((8, 3)))
+        y = Placeholder(np.random.random((8, 1)))
+        w = Variable(np.random.random((3, 1)))
+        b = Variable(0.1)
+        pred = (X @ w + b).tanh() * 2
+        loss = ((pred - y) ** 2 + (pred - y).abs()).sum() / 8
+
+        tape = loss.compile()
+        fused = [node for node in tape._nodes if isinstance(node, FusedNode)]
+        # tanh, mul and the loss expression up to sum
+        self.assertEqual(len(fused), 2)
+        self.assertIsNone(tape.value(pred))
+        plan = loss._executionPlan()
+
+        for rows in (8, 5):
+            X.feed(np.random.random((rows, 3)))
+            y.feed(np.random.random((rows, 1)))
+            expected = []
+            for model in (loss, CompiledGraph(loss, plan, fuse=False)):
+                model.zeroGrad()
+                model.calcGrad()
+                expected.append((loss.scalar, w.grad.copy(), b.grad.copy()))
+            for _ in range(2):
+                tape.zeroGrad()
+                tape.calcGrad()
+                for scalar, wGrad, bGrad in expected:
+                    self.assertAlmostEqual(loss.scalar, scalar)
+                    np.testing.assert_allclose(w.grad, wGrad)
+                    np.testing.assert_allclose(b.grad, bGrad)
+
+
+if __name__ == '__main__':
+    unittest.main()
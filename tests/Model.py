@@ -0,0 +1,250 @@
+import os
+import pathlib
+import tempfile
+import unittest
+from multiprocessing.shared_memory import SharedMemory
+from unittest import mock
+import numpy as np
+import simplegrad as sg
+import simplegrad.algo.nn as sgnn
+from simplegrad.algo.optimize import Adam, GD, Momentum, RMSProp
+from simplegrad.algo.nn.DataParallel import DataParallel
+
+
+def _dataset(rows=120, seed=0):
+    np.random.seed(seed)
+    X = np.random.random((rows, 4))
+    y = X @ np.array([[1.0], [-2.0], [0.5], [3.0]]) + 0.1
+    return X, y
+
+
+class ModelTestCase(unittest.TestCase):
+    @staticmethod
+    def _model():
+        np.random.seed(1)
+        return sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=1, activation="linear")])
+
+    def test_minibatch_fit(self):
+        X, y = _dataset()
+        model = self._model()
+        calls = []
+        factory = model._modelFactory
+        model._modelFactory = lambda input: calls.append(input.shape) or factory(input)
+
+        history = []
+        model.fit(X, y, optimizer=Adam(lr=0.05), batch_size=32, shuffle=True, epochs=150, history=history)
+        # 120 rows give batches of 32 and a remainder of 24, fed into one graph
+        self.assertEqual(calls, [(32, 4)])
+        self.assertEqual(len(history), 150 * 4)
+        self.assertLess(((model.predict(X) - y) ** 2).mean(), 1e-2)
+
+    def test_custom_loss_arguments(self):
+        X, y = _dataset()
+        model = self._model()
+        received = []
+
+        def loss(prediction, target):
+            received.append((prediction.shape, type(target).__name__))
+            # Asymmetric: under-prediction costs ten times more
+            error = target - prediction
+            return (error.relu() * 10 + (-1 * error).relu()).sum()
+
+        model.fit(X, y, loss=loss, optimizer=Adam(lr=0.05), epochs=300)
+        self.assertEqual(received, [((120, 1), "Placeholder")])
+        # Predictions settle above most targets
+        self.assertGreater((model.predict(X) >= y - 1e-3).mean(), 0.8)
+
+    def test_varying_batch_rows(self):
+        X, y = _dataset()
+        model = self._model()
+        calls = []
+        factory = model._modelFactory
+        model._modelFactory = lambda input: calls.append(input.shape) or factory(input)
+        sizes = [10, 17, 23, 30, 40]
+        starts = np.cumsum([0] + sizes)
+        chunks = [(X[start:stop], y[start:stop]) for start, stop in zip(starts, starts[1:])]
+
+        history = []
+        # Weights stay fixed, so every loss is the error of the initial model on its chunk
+        model.fit(chunks, optimizer=GD(lr=0), epochs=2, history=history)
+        self.assertEqual(calls, [(10, 4)])
+        model._modelFactory = factory
+        expected = [((model.predict(X_chunk) - y_chunk) ** 2).sum() for X_chunk, y_chunk in chunks]
+        np.testing.assert_allclose(history, expected * 2)
+
+    def test_generator_fit(self):
+        X, y = _dataset()
+        model = self._model()
+
+        def chunks():
+            for start in range(0, len(X), 40):
+                yield X[start:start + 40], y[start:start + 40]
+
+        history = []
+        model.fit(chunks(), optimizer=Adam(lr=0.05), epochs=5, history=history)
+        # Generator is consumed by the first epoch
+        self.assertEqual(len(history), 3)
+
+        history = []
+        model.fit(list(chunks()), optimizer=Adam(lr=0.05), epochs=200, history=history)
+        self.assertEqual(len(history), 600)
+        self.assertLess(((model.predict(X) - y) ** 2).mean(), 1e-2)
+
+    def test_predict_reuses_graph(self):
+        X, y = _dataset()
+        model = sgnn.SequentialModel(layers=[
+            sgnn.DenseLayer(num_neurons=8, activation="tanh"),
+            sgnn.DenseLayer(num_neurons=3, activation="softmax")
+        ])
+        calls = []
+        factory = model._modelFactory
+        model._modelFactory = lambda input: calls.append(input.shape) or factory(input)
+
+        full = model.predict(X)
+        self.assertEqual(full.shape, (120, 3))
+        for rows in (1, 7, 120, 33):
+            np.testing.assert_allclose(model.predict(X[:rows]), full[:rows])
+        self.assertEqual(len(calls), 1)
+
+    def test_chunked_loss_fit(self):
+        X, y = _dataset()
+        histories = []
+        for chunk_size in (None, 16):
+            model = self._model()
+            history = []
+            model.fit(X, y, optimizer=Adam(lr=0.05), iterations=20, history=history, chunk_size=chunk_size)
+            histories.append(history)
+        np.testing.assert_allclose(histories[0], histories[1])
+
+    def test_full_batch_fit(self):
+        X, y = _dataset()
+        model = self._model()
+        history = []
+        model.fit(X, y, optimizer=Adam(lr=0.05), iterations=300, history=history)
+        self.assertEqual(len(history), 300)
+        self.assertLess(history[-1], history[0])
+
+    def test_flat_optimizers(self):
+        X, y = _dataset()
+        for optimizer in (Adam, GD, Momentum, RMSProp):
+            histories = []
+            for flat in (False, True):
+                np.random.seed(1)
+                model = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=4, activation="tanh"),
+                                                     sgnn.DenseLayer(num_neurons=1, activation="linear")])
+                history = []
+                instance = optimizer(lr=0.01, flat=flat)
+                model.fit(X, y, optimizer=instance, batch_size=50, epochs=5, history=history)
+                histories.append(history)
+            np.testing.assert_allclose(histories[0], histories[1], err_msg=optimizer.__name__)
+            # Variables and their gradients stay views into the buffer
+            for var in model._trainable():
+                self.assertTrue(np.shares_memory(var.value, instance._buffer.values))
+                self.assertTrue(np.shares_memory(var.grad, instance._buffer.grads))
+
+    def test_profiled_fit(self):
+        X, y = _dataset()
+        model = self._model()
+        model.fit(X, y, optimizer=Adam(lr=0.05), batch_size=40, epochs=2, profile=True)
+        ops = {(row["op"], row["phase"]): row for row in model.profiler.ops()}
+        # Three batches per epoch
+        self.assertEqual(ops[("MatmulNode", "forward")]["calls"], 6)
+        self.assertEqual(ops[("MatmulNode", "backward")]["calls"], 6)
+
+    def test_checkpointed_fit(self):
+        X, y = _dataset()
+        histories = []
+        for checkpoint in (None, "layers", 2):
+            np.random.seed(1)
+            model = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=4, activation="tanh"),
+                                                 sgnn.DenseLayer(num_neurons=4, activation="tanh"),
+                                                 sgnn.DenseLayer(num_neurons=1, activation="linear")])
+            history = []
+            model.fit(X, y, optimizer=Adam(lr=0.01), batch_size=50, epochs=3, history=history,
+                      checkpoint=checkpoint)
+            histories.append(history)
+        for history in histories[1:]:
+            np.testing.assert_allclose(history, histories[0])
+
+    def test_data_parallel_fit(self):
+        X, y = _dataset(rows=130)
+        for optimizer in (lambda: Adam(lr=0.01), lambda: GD(lr=0.001), lambda: Momentum(lr=0.001, flat=True)):
+            histories = []
+            weights = []
+            for processes in (None, 3):
+                np.random.seed(1)
+                model = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=4, activation="tanh"),
+                                                     sgnn.DenseLayer(num_neurons=1, activation="linear")])
+                history = []
+                # The last batch of 30 rows leaves shards of 10 rows
+                model.fit(X, y, optimizer=optimizer(), batch_size=50, epochs=4, history=history,
+                          processes=processes)
+                histories.append(history)
+                weights.append([np.array(var.value) for var in model._trainable()])
+            np.testing.assert_allclose(histories[0], histories[1])
+            for single, parallel in zip(*weights):
+                np.testing.assert_allclose(single, parallel)
+
+    def test_save_load(self):
+        X, y = _dataset()
+        np.random.seed(1)
+        model = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=4, activation="tanh"),
+                                             sgnn.DenseLayer(num_neurons=1, activation="linear")],
+                                     precision=sg.Precision("float32"))
+        model.fit(X, y, optimizer=Adam(lr=0.05), epochs=20)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.sgw")
+            model.save(path)
+            saved = pathlib.Path(path).read_bytes()
+
+            loaded = sgnn.SequentialModel.load(path)
+            np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+            for var, original in zip(loaded._trainable(), model._trainable()):
+                # Mapped without copying, in dtype of the saved model
+                self.assertIsInstance(var.value, np.memmap)
+                self.assertFalse(var.value.flags.writeable)
+                self.assertEqual(var.value.dtype, np.float32)
+                self.assertEqual(var.defined_name, original.defined_name)
+
+            # Built graphs keep their variables, values are replaced (cast to float64 of this model)
+            np.random.seed(2)
+            other = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=4, activation="tanh"),
+                                                 sgnn.DenseLayer(num_neurons=1, activation="linear")])
+            other.predict(X)
+            other.loadWeights(path)
+            np.testing.assert_allclose(other.predict(X), model.predict(X), atol=1e-5)
+
+            # Training copies mapped weights, the file is unchanged
+            history = []
+            loaded.fit(X, y, optimizer=Adam(lr=0.01), epochs=5, history=history)
+            self.assertLess(history[-1], history[0])
+            self.assertEqual(pathlib.Path(path).read_bytes(), saved)
+
+    def test_data_parallel_worker_error(self):
+        X, y = _dataset()
+        model = self._model()
+        parent = os.getpid()
+
+        def loss(prediction, target):
+            # Graphs of workers are built in forked processes
+            if os.getpid() != parent:
+                raise ValueError("loss failed in worker")
+            return ((target - prediction) ** 2).sum()
+
+        instances = []
+        close = DataParallel.close
+        with mock.patch.object(DataParallel, "close", lambda self: instances.append(self) or close(self)):
+            with self.assertRaises(ValueError) as context:
+                model.fit(X, y, loss=loss, optimizer=Adam(), epochs=2, processes=2)
+        self.assertIn("loss failed in worker", str(context.exception))
+        self.assertIn("Traceback", str(context.exception.__cause__))
+        parallel, = instances
+        self.assertEqual(parallel._workers, [])
+        # Shared memory is unlinked
+        for memory in (parallel._paramsMemory, parallel._gradsMemory):
+            with self.assertRaises(FileNotFoundError):
+                SharedMemory(name=memory.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
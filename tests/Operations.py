@@ -1,4 +1,5 @@
-from simplegrad import Value, Variable
+from simplegrad import Value, Variable, Placeholder
+from simplegrad.implementation.operations.LambdaNode import LambdaNode
 import unittest
 import numpy as np
 
@@ -152,3 +153,103 @@ class OperationsTestCase(unittest.TestCase):
             self.assertAlmostEqual(u._grad, uRealGrad(u._frwd, v._frwd, 5))
             self.assertAlmostEqual(v._grad, vRealGrad(u._frwd, v._frwd, 5))
 
+    def test_broadcast_grad(self):
+        np.random.seed(0)
+        a = np.random.random((4, 3))
+        bias = np.random.random((1, 3))
+        column = np.random.random((4, 1))
+        u = Variable(a)
+        b = Variable(bias)
+        c = Variable(column)
+        f = ((u + b) * c / 2).sum()
+        self.assertEqual(len(f.topoSorted(onlygrad=False)), 7)
+        for model in (f, f.compile()):
+            model.zeroGrad()
+            model.calcGrad()
+            self.assertAlmostEqual(f.scalar, ((a + bias) * column / 2).sum())
+            np.testing.assert_allclose(u.grad, np.broadcast_to(column / 2, a.shape))
+            np.testing.assert_allclose(b.grad, (column / 2).sum(axis=0, keepdims=True) * np.ones((1, 3)))
+            np.testing.assert_allclose(c.grad, (a + bias).sum(axis=1, keepdims=True) / 2)
+
+    def test_scalar_base_pow(self):
+        u = Variable(np.random.random((2, 2)))
+        f = (2 ** u).sum()
+        f.calcGrad()
+        np.testing.assert_allclose(u.grad, np.log(2) * 2 ** u.value)
+        self.assertAlmostEqual(f.gradientGraph(by=u).forward()[0, 0], u.grad.sum())
+
+    def test_activations(self):
+        def softmax(x):
+            exp = np.exp(x - x.max(axis=-1, keepdims=True))
+            return exp / exp.sum(axis=-1, keepdims=True)
+
+        references = {
+            "tanh": np.tanh,
+            "relu": lambda x: x * (x > 0),
+            "elu": lambda x: np.where(x > 0, x, np.exp(x) - 1),
+            "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+            "softmax": softmax,
+            "log_softmax": lambda x: np.log(softmax(x)),
+        }
+        np.random.seed(0)
+        a = np.random.random((4, 3)) * 6 - 3
+        weights = np.random.random((4, 3))
+        for name, reference in references.items():
+            u = Variable(a)
+            f = (getattr(u, name)() * Value(weights)).sum()
+            f.calcGrad()
+            np.testing.assert_allclose(f.scalar, (reference(a) * weights).sum(), err_msg=name)
+
+            numeric = np.zeros_like(a)
+            for index in np.ndindex(a.shape):
+                step = np.zeros_like(a)
+                step[index] = 1e-6
+                numeric[index] = ((reference(a + step) - reference(a - step)) * weights).sum() / 2e-6
+            np.testing.assert_allclose(u.grad, numeric, rtol=1e-5, atol=1e-7, err_msg=name)
+            # Derivative graph is directional derivative along ones
+            np.testing.assert_allclose(f.gradientGraph(by=u).forward()[0, 0], numeric.sum(), rtol=1e-5, atol=1e-7,
+                                       err_msg=name)
+
+    def test_crossentropy(self):
+        np.random.seed(0)
+        logits = np.random.random((5, 3)) * 4
+        labels = np.eye(3)[np.random.randint(0, 3, 5)]
+        u = Variable(logits)
+        loss = u.softmax().crossentropy(Value(labels))
+        self.assertEqual(len(loss.topoSorted(onlygrad=False)), 3)
+        loss.calcGrad()
+
+        v = Variable(logits)
+        composite = (-1 * v.log_softmax() * Value(labels)).sum()
+        composite.calcGrad()
+        self.assertAlmostEqual(loss.scalar, composite.scalar)
+        np.testing.assert_allclose(u.grad, v.grad)
+        np.testing.assert_allclose(u.grad, np.exp(v.log_softmax().forward()) - labels)
+        self.assertAlmostEqual(loss.gradientGraph(by=u).forward()[0, 0], composite.gradientGraph(by=v).forward()[0, 0])
+
+        # Probabilities that are not a softmax output use the logarithm directly
+        probs = Variable(np.exp(v.log_softmax().forward()))
+        self.assertAlmostEqual(probs.crossentropy(labels).forward()[0, 0], composite.scalar, places=5)
+
+
+    def test_lambda_shape(self):
+        a = np.random.random((10, 2))
+        x = Variable(a)
+        # Output rows differ from input rows
+        flat = LambdaNode(x, lambda v: v.reshape(-1, 1), lambda grad, frwd, v: grad.reshape(v.shape))
+        self.assertEqual(flat.shape, (20, 1))
+        f = (flat + Value(np.ones((20, 1)))).sum()
+        self.assertAlmostEqual(f.forward()[0, 0], a.sum() + 20)
+        f.backward()
+        np.testing.assert_allclose(x.grad, np.ones((10, 2)))
+
+    def test_lambda_shape_of_placeholder(self):
+        X = Placeholder(np.random.random((10, 2)))
+        # Rows of placeholder inputs are probed, a mismatch is reported by forward
+        flat = LambdaNode(X, lambda v: v.reshape(-1, 1), lambda grad, frwd, v: grad.reshape(v.shape))
+        with self.assertRaises(AssertionError):
+            flat.forward()
+        rows = LambdaNode(X, lambda v: v.sum(axis=1, keepdims=True), lambda grad, frwd, v: grad + 0 * v)
+        self.assertEqual(rows.shape, (10, 1))
+        X.feed(np.random.random((7, 2)))
+        self.assertEqual(rows.forward().shape, (7, 1))
@@ -0,0 +1,117 @@
+import unittest
+import numpy as np
+import simplegrad as sg
+import simplegrad.algo.nn as sgnn
+from simplegrad import Precision, Value, Variable
+from simplegrad.algo.optimize import Adam, GD
+
+from .Model import _dataset
+
+
+class PrecisionTestCase(unittest.TestCase):
+    def test_float32_graph(self):
+        with Precision("float32"):
+            val = np.random.random((4, 3)).astype(np.float32)
+            x = Value(val)
+            w = Variable(np.random.random((3, 2)))
+            graph = (x @ w).sigmoid().sum()
+        self.assertIs(x.value, val)
+        self.assertEqual(w.value.dtype, np.float32)
+        for model in (graph, graph.compile()):
+            model.zeroGrad()
+            model.calcGrad()
+            self.assertEqual(graph.value.dtype, np.float32)
+            self.assertEqual(w.grad.dtype, np.float32)
+
+    def test_scalars_keep_dtype(self):
+        with Precision("float32"):
+            x = Variable(np.random.random((4, 3)))
+            graph = ((x * 0.5 + 1) ** 2 / 3 - np.float64(1)).sum()
+        for model in (graph, graph.compile()):
+            model.zeroGrad()
+            model.calcGrad()
+            self.assertEqual(graph.value.dtype, np.float32)
+            self.assertEqual(x.grad.dtype, np.float32)
+
+    def test_precision_scope(self):
+        with Precision("float32"):
+            with Precision("float16", master="float32"):
+                self.assertTrue(sg.getPrecision().mixed)
+            self.assertEqual(Value(1).value.dtype, np.float32)
+        self.assertEqual(Value(1).value.dtype, np.float64)
+        try:
+            sg.setPrecision("float32")
+            self.assertEqual(Variable(1).value.dtype, np.float32)
+        finally:
+            sg.setPrecision()
+        self.assertEqual(Variable(1).value.dtype, np.float64)
+
+    def test_mixed_precision_variable(self):
+        with Precision("float16", master="float32"):
+            w = Variable(np.random.random((3, 2)))
+            graph = (Value(np.ones((4, 3))) @ w).sum()
+        tape = graph.compile()
+        tape.calcGrad()
+        self.assertEqual(w.value.dtype, np.float32)
+        self.assertEqual(tape.value(w).dtype, np.float16)
+        self.assertEqual(graph.value.dtype, np.float16)
+        self.assertEqual(w.grad.dtype, np.float32)
+        w.value -= 0.5 * w.grad
+        self.assertEqual(w.value.dtype, np.float32)
+
+    def test_float32_halves_buffers(self):
+        def buffers(precision):
+            with precision:
+                X = Value(np.random.random((256, 64)))
+                w = Variable(np.random.random((64, 32)))
+                tape = (X @ w).sigmoid().sum().compile()
+            tape.calcGrad()
+            return sum([array.nbytes for array in tape._values + tape._grads if array is not None])
+
+        self.assertEqual(buffers(Precision("float32")) * 2, buffers(Precision("float64")))
+
+    def test_float32_fit(self):
+        X, y = _dataset()
+        histories = []
+        for precision in (Precision("float64"), Precision("float32")):
+            np.random.seed(1)
+            model = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=1, activation="linear")],
+                                         precision=precision)
+            history = []
+            optimizer = Adam(lr=0.05)
+            model.fit(X, y, optimizer=optimizer, batch_size=32, epochs=20, history=history)
+            histories.append(history)
+            weight = model._trainable()[0]
+            self.assertEqual(weight.value.dtype, precision.master)
+            self.assertEqual(optimizer._m[weight.id].dtype, precision.master)
+            self.assertEqual(model.predict(X).dtype, precision.compute)
+        np.testing.assert_allclose(histories[0], histories[1], rtol=1e-4)
+
+    def test_mixed_precision_fit(self):
+        X, y = _dataset()
+        np.random.seed(1)
+        model = sgnn.SequentialModel(layers=[sgnn.DenseLayer(num_neurons=1, activation="linear")],
+                                     precision=Precision("float16", master="float32"))
+        optimizer = Adam(lr=0.05)
+        model.fit(X, y, optimizer=optimizer, batch_size=32, epochs=150)
+        self.assertEqual(model._trainable()[0].value.dtype, np.float32)
+        self.assertLess(((model.predict(X) - y) ** 2).mean(), 1e-2)
+
+    def test_loss_scale_overflow(self):
+        with Precision("float16", master="float32"):
+            x = Variable(1.5)
+            loss = (x - 1) ** 2
+        optimizer = GD(model=loss, variables=[x], lr=0.1)
+        # Seeds above 65504 do not fit into float16, such steps are skipped
+        optimizer.loss_scale = 2.0 ** 17
+        optimizer.step()
+        self.assertEqual(x.scalar, 1.5)
+        self.assertEqual(optimizer.loss_scale, 2.0 ** 16)
+        optimizer.step()
+        optimizer.step()
+        self.assertEqual(optimizer.loss_scale, 2.0 ** 15)
+        self.assertAlmostEqual(x.scalar, 1.4, places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()